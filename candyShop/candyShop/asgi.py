@@ -12,5 +12,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'candyShop.settings')
+os.environ.setdefault('DJANGO_ASGI', '1')  # settings pick ASGI-safe database connection defaults
 
 application = get_asgi_application()
@@ -14,6 +14,7 @@ from pathlib import Path
 from datetime import timedelta
 import environ
 import os
+from django.core.exceptions import ImproperlyConfigured
 
 # Init env vars
 env = environ.Env()
@@ -57,7 +58,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.middleware.InstrumentationMiddleware', # query count/timing + Server-Timing header, only with SHOP_INSTRUMENTATION=True
+    'shop.middleware.CompressionMiddleware', # gzip/brotli responses, reuses compressed bodies of cached responses
     'corsheaders.middleware.CorsMiddleware', #Runs cors before other middleware
+    'shop.middleware.LoadSheddingMiddleware', # 503 + Retry-After above SHOP_MAX_CONCURRENT_REQUESTS in flight
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,8 +69,41 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'shop.middleware.ReplicaRoutingMiddleware', # safe requests read from the replica (if configured)
 ]
 
+# per-request sql/render timings (Server-Timing header + /shop/metrics/), off by default
+SHOP_INSTRUMENTATION = env.bool('SHOP_INSTRUMENTATION', default=False)
+
+# response compression (gzip, plus brotli when the package is installed), skipped for small bodies
+SHOP_COMPRESSION = env.bool('SHOP_COMPRESSION', default=True)
+SHOP_COMPRESS_MIN_BYTES = env.int('SHOP_COMPRESS_MIN_BYTES', default=1024)
+
+# requests in flight per process before new ones are shed with 503 (0 = no limit)
+SHOP_MAX_CONCURRENT_REQUESTS = env.int('SHOP_MAX_CONCURRENT_REQUESTS', default=0)
+SHOP_SHED_RETRY_AFTER = env.int('SHOP_SHED_RETRY_AFTER', default=1)  # seconds
+
+# token bucket throttling of the public (AllowAny) endpoints, see shop/throttling.py.
+# rates in tokens/second, each request costs COSTS[url name] tokens (default 1).
+# STORE: 'local' (per process) or a CACHES alias to share the buckets between workers
+SHOP_THROTTLE = {
+    'ENABLED': env.bool('SHOP_THROTTLE_ENABLED', default=True),
+    'STORE': env('SHOP_THROTTLE_STORE', default='local'),
+    'CLIENT_RATE': env.float('SHOP_THROTTLE_CLIENT_RATE', default=10),
+    'CLIENT_BURST': env.int('SHOP_THROTTLE_CLIENT_BURST', default=60),
+    'GLOBAL_RATE': env.float('SHOP_THROTTLE_GLOBAL_RATE', default=500),
+    'GLOBAL_BURST': env.int('SHOP_THROTTLE_GLOBAL_BURST', default=1000),
+    'COSTS': {
+        'search_product': 5,
+        'get_multiple_products': 3,
+        'export_products': 30,
+        'reserve_stock': 5,
+    },
+}
+
+# minutes a checkout reservation holds stock before expire_reservations gives it back
+SHOP_RESERVATION_MINUTES = env.int('SHOP_RESERVATION_MINUTES', default=15)
+
 ROOT_URLCONF = 'candyShop.urls'
 
 TEMPLATES = [
@@ -102,6 +139,46 @@ DATABASES = {
     }
 }
 
+# connection reuse, DB_CONN_MODE:
+#   'none'       -> new connection per request (old behaviour, default under ASGI)
+#   'persistent' -> keep connections open DB_CONN_MAX_AGE seconds, checked before reuse (default under WSGI)
+#   'pool'       -> psycopg 3 connection pool (needs psycopg[pool] installed instead of psycopg2)
+# under ASGI (uvicorn candyShop.asgi, which sets DJANGO_ASGI) every sync_to_async thread would keep
+# its own persistent connection open and use up a small postgres connection limit, django advises
+# against persistent connections there, so that combination is refused
+RUNNING_ASGI = env.bool('DJANGO_ASGI', default=False)
+DB_CONN_MODE = env('DB_CONN_MODE', default='none' if RUNNING_ASGI else 'persistent')
+if RUNNING_ASGI and DB_CONN_MODE == 'persistent':
+    raise ImproperlyConfigured("DB_CONN_MODE='persistent' can't be used under ASGI, use 'none' or 'pool'.")
+
+if DB_CONN_MODE == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=60)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True  # drop dead connections (heroku restarts, idle timeouts) before use
+elif DB_CONN_MODE == 'pool':
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            'timeout': env.int('DB_POOL_TIMEOUT', default=10),  # seconds to wait for a free connection
+        },
+    }
+
+# optional read replica (DB_REPLICA_HOST, other settings default to the primary's).
+# safe GET views read from it, writes and a client's reads right after its own write go to 'default'
+if env('DB_REPLICA_HOST', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': env('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'USER': env('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': env('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': env('DB_REPLICA_HOST').strip(),
+        'TEST': {'MIRROR': 'default'},  # tests run against a single database
+    }
+
+DATABASE_ROUTERS = ['shop.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = env.int('REPLICA_PIN_SECONDS', default=10)  # read-your-writes window after a write
+REPLICA_PIN_CACHE = env('REPLICA_PIN_CACHE', default='default')  # CACHES alias for the pins, must be shared (CACHE_URL)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -146,11 +223,15 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'shop.authentication.CachedJWTAuthentication',  # JWTAuthentication + cache of verified tokens
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',  # Default permission: authenticated users only
     ),
+    # proxies in front of the app, throttling takes the client IP this many hops from the end of
+    # X-Forwarded-For (0 = REMOTE_ADDR). never unset: DRF would trust the client-supplied header.
+    # heroku's router (DYNO is set on every dyno) appends the address it saw as the last entry
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=1 if 'DYNO' in os.environ else 0),
 }
 
 SIMPLE_JWT = {
@@ -159,6 +240,11 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
 }
 
+# verified access tokens kept per process (shop/authentication.py), no User query on a hit.
+# entries expire with the token, but after SHOP_JWT_CACHE_SECONDS at the latest
+SHOP_JWT_CACHE_SIZE = env.int('SHOP_JWT_CACHE_SIZE', default=1024)
+SHOP_JWT_CACHE_SECONDS = env.int('SHOP_JWT_CACHE_SECONDS', default=60)
+
 DJOSER = {
     'LOGIN_FIELD': 'username',  # Use email or username for login
     'SERIALIZERS': {
@@ -172,5 +258,28 @@ DJOSER = {
 }
 
 
+# cache used by shop.cache.DjangoCacheBackend (e.g. CACHE_URL=redis://localhost:6379/0)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# response cache for public catalog endpoints (shop/cache.py). the catalog version is shared by all
+# workers either way; LocalLRUBackend keeps the entries per process, shop.cache.DjangoCacheBackend
+# with a shared CACHE_URL keeps one copy for all of them
+SHOP_CACHE_BACKEND = env('SHOP_CACHE_BACKEND', default='shop.cache.LocalLRUBackend')
+SHOP_CACHE_OPTIONS = {
+    'timeout': env.int('SHOP_CACHE_TIMEOUT', default=300),  # seconds
+}
+if SHOP_CACHE_BACKEND == 'shop.cache.LocalLRUBackend':
+    SHOP_CACHE_OPTIONS['max_entries'] = env.int('SHOP_CACHE_MAX_ENTRIES', default=1024)  # response bodies and etag memos
+    SHOP_CACHE_OPTIONS['max_bytes'] = env.int('SHOP_CACHE_MAX_BYTES', default=64 * 1024 * 1024)  # per process
+    # per-product entries of get_multiple_products, a separate LRU so carts don't evict catalog pages
+    SHOP_PRODUCT_CACHE_OPTIONS = {
+        'max_entries': env.int('SHOP_PRODUCT_CACHE_MAX_ENTRIES', default=20000),
+        'max_bytes': env.int('SHOP_PRODUCT_CACHE_MAX_BYTES', default=16 * 1024 * 1024),
+    }
+
+
 CORS_ALLOW_ALL_ORIGINS = True # for dev purposes
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = ['X-Missing-Product-Ids']  # let the frontend read ids missing from get_multiple_products
\ No newline at end of file
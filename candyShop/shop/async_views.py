@@ -0,0 +1,156 @@
+# async (ASGI) versions of the public catalog views, built on the async ORM.
+# DRF function views are sync only, so these are plain Django async views with the same
+# query params and response bodies as their views.py counterparts. served under shop/async/...
+# and only useful when running under an ASGI server (uvicorn candyShop.asgi:application).
+# throttled with the same token buckets as the DRF views (per client IP)
+import json
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from .models import Product, Category
+from .serializers import ProductSerializer, ProductFastSerializer, parse_product_fields, render_json, PUBLIC_PRODUCT_FIELDS
+from .pagination import InvalidParameter
+from .filters import ProductListParams, facet_rows, build_facets
+from .cache import category_cache, acache_response
+from .conditional import acondition_on_catalog, CATALOG_VERSION
+from .search import asearch_products, parse_limit_offset, SEARCH_PARAMS
+from .batch import afetch_products, clean_ids, MAX_IDS
+from .throttling import throttle_public
+
+
+def json_response(data, status=200):
+    return HttpResponse(render_json(data), status=status, content_type='application/json')
+
+
+# same as requested_category_ids in views.py, with the async category lookup
+async def arequested_category_ids(params):
+    if not params.categories:
+        return None
+    category_ids = [await category_cache.aget_id(name) for name in params.categories]
+    if None in category_ids:
+        raise Category.DoesNotExist
+    return category_ids
+
+
+# ETag/Last-Modified scopes, same as the ones in views.py
+async def product_list_scope(request):
+    try:
+        params = ProductListParams(request)
+        category_ids = None if params.facets else await arequested_category_ids(params)
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            return CATALOG_VERSION
+        return params.filter(Product.objects.all(), category_ids)
+    except (Category.DoesNotExist, InvalidParameter):
+        return None
+
+
+async def individual_product_scope(request, product_id):
+    return Product.objects.filter(id=product_id)
+
+
+async def search_product_scope(request):
+    return CATALOG_VERSION if request.GET.get('search_product') else None
+
+
+@require_GET
+@throttle_public
+@acondition_on_catalog(product_list_scope, ProductListParams.QUERY_PARAMS)
+@acache_response(*ProductListParams.QUERY_PARAMS)
+async def product_list(request):
+    try:
+        fields = parse_product_fields(request.GET.get('fields'))
+        params = ProductListParams(request)
+        category_ids = await arequested_category_ids(params)
+        products = params.filter(Product.objects.all(), category_ids)
+
+        serializer = ProductFastSerializer(fields)
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            paginator = params.paginator(request)
+            page, next_cursor = await paginator.apaginate(serializer.values(products, extra=paginator.cursor_columns))
+            data = {"results": serializer.to_representation(page), "next_cursor": next_cursor}
+        else:
+            rows = [row async for row in serializer.values(params.order(products))]
+            data = serializer.to_representation(rows)
+
+        if params.facets:
+            rows = [row async for row in facet_rows(params.filter_price(Product.objects.all()))]
+            facets = build_facets(rows, category_ids)
+            data = {**data, "facets": facets} if isinstance(data, dict) else {"results": data, "facets": facets}
+        return json_response(data)
+
+    except InvalidParameter as e:
+        return json_response({"error": str(e)}, status=400)
+
+    except Category.DoesNotExist:
+        return json_response({"error": "Category not found"}, status=404)
+
+    except Exception as e:
+        return json_response({"error": str(e)}, status=500)
+
+
+@require_GET
+@throttle_public
+@acondition_on_catalog(individual_product_scope)
+@acache_response()
+async def individual_product(request, product_id):
+    try:
+        serializer = ProductFastSerializer()
+        row = await serializer.values(Product.objects.filter(id=product_id)).aget()
+        return json_response(serializer.to_representation([row])[0])
+
+    except Product.DoesNotExist:
+        return json_response({"error": "Product not found"}, status=404)
+
+    except Exception as e:
+        return json_response({"error": str(e)}, status=500)
+
+
+@require_GET
+@throttle_public
+@acondition_on_catalog(search_product_scope, SEARCH_PARAMS)
+@acache_response(*SEARCH_PARAMS)
+async def search_product(request):
+    try:
+        search_query = request.GET.get('search_product', '')
+        limit, offset = parse_limit_offset(request)
+
+        products = await asearch_products(search_query, limit, offset) if search_query else []
+        if not products:
+            return json_response({"message": "No products found"}, status=404)
+
+        return json_response(ProductSerializer(products, many=True, fields=PUBLIC_PRODUCT_FIELDS).data)  # no queries, category is read as pk
+
+    except InvalidParameter as e:
+        return json_response({"error": str(e)}, status=400)
+
+    except Exception as e:
+        return json_response({"error": str(e)}, status=500)
+
+
+@csrf_exempt  # public JSON endpoint, like the DRF version
+@require_POST
+@throttle_public
+async def get_multiple_products(request):
+    try:
+        try:
+            ids_list = json.loads(request.body or b'{}').get('ids', [])
+        except (ValueError, AttributeError):
+            return json_response({"error": "Body must be a JSON object."}, status=400)
+
+        if not isinstance(ids_list, list) or not ids_list:
+            return json_response({"error": "'ids' must be a non-empty list."}, status=400)
+        if len(ids_list) > MAX_IDS:
+            return json_response({"error": f"Too many IDs provided. Maximum allowed is {MAX_IDS}."}, status=400)
+
+        valid_ids = clean_ids(ids_list)
+        if not valid_ids:
+            return json_response({"error": "No valid IDs provided."}, status=400)
+
+        products, missing_ids = await afetch_products(valid_ids)
+        response = json_response(products)
+        if missing_ids:
+            response['X-Missing-Product-Ids'] = ','.join(map(str, missing_ids))
+        return response
+
+    except Exception:
+        return json_response({"error": "An internal server error occurred."}, status=500)
@@ -0,0 +1,78 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+# in-process LRU of already verified access tokens -> (user, validated token).
+# an entry lives until the token expires, but at most MAX_AGE seconds, so a user deactivated or
+# with a changed password in another worker process is rejected again after that at the latest.
+# saves/deletes of a user in this process drop their entries right away (see signals.py)
+class VerifiedTokenCache:
+    def __init__(self, max_entries=1024, max_age=60):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()  # sha256 of the raw token -> (expires_at, user, validated_token)
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry[1], entry[2]
+
+    def set(self, digest, user, validated_token):
+        expires_at = min(validated_token['exp'], time.time() + self.max_age)  # 'exp' is a unix timestamp
+        with self._lock:
+            self._entries[digest] = (expires_at, user, validated_token)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)  # least recently used
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for digest in [digest for digest, entry in self._entries.items() if entry[1].pk == user_id]:
+                del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = VerifiedTokenCache(
+    max_entries=getattr(settings, 'SHOP_JWT_CACHE_SIZE', 1024),
+    max_age=getattr(settings, 'SHOP_JWT_CACHE_SECONDS', 60),
+)
+
+
+# JWTAuthentication that skips signature verification and the User query for tokens it already
+# verified (same SIMPLE_JWT settings and checks on a miss: expiry, active user, CHECK_REVOKE_TOKEN).
+# only valid tokens are cached, a bad or expired token always goes through the full check
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        digest = hashlib.sha256(raw_token).hexdigest()
+        cached = token_cache.get(digest)
+        if cached is not None:
+            user, validated_token = cached
+            return copy.copy(user), validated_token  # copy, views must not share one instance across requests
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_user(validated_token)
+        token_cache.set(digest, user, validated_token)
+        return user, validated_token
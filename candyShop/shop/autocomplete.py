@@ -0,0 +1,85 @@
+import bisect
+import threading
+import time
+from .models import Product
+
+
+# in-memory prefix index of product names for search-as-you-type.
+# sorted list of (key, id) where key is the lowercased name from each word start
+# ("sour candy" -> "sour candy", "candy"), so "can" finds it too. lookups are a bisect + short scan.
+# built on first use, kept current by Product save/delete signals (see signals.py); the TTL
+# refresh picks up writes made by other worker processes
+class AutocompleteIndex:
+    TTL = 300  # seconds
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None  # sorted [(key, id)]
+        self._names = {}  # id -> name
+        self._built_at = 0.0
+
+    @staticmethod
+    def _keys(name):
+        lowered = name.lower()
+        return {lowered[i:] for i, char in enumerate(lowered) if char.isalnum() and (i == 0 or not lowered[i - 1].isalnum())}
+
+    def _build(self):
+        entries, names = [], {}
+        for pk, name in Product.objects.values_list('id', 'name').iterator():
+            names[pk] = name
+            entries.extend((key, pk) for key in self._keys(name))
+        entries.sort()
+        self._entries, self._names, self._built_at = entries, names, time.monotonic()
+
+    def _ensure_built(self):
+        if self._entries is None or time.monotonic() - self._built_at > self.TTL:
+            self._build()
+
+    # top `limit` [{"id", "name"}] whose name (or a word in it) starts with prefix
+    def lookup(self, prefix, limit=10):
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        with self._lock:
+            self._ensure_built()
+            results, seen = [], set()
+            start = bisect.bisect_left(self._entries, (prefix,))
+            for key, pk in self._entries[start:]:
+                if not key.startswith(prefix) or len(results) >= limit:
+                    break
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append({"id": pk, "name": self._names[pk]})
+            return results
+
+    def _remove_unlocked(self, pk):
+        name = self._names.pop(pk, None)
+        if name is None:
+            return
+        for key in self._keys(name):
+            i = bisect.bisect_left(self._entries, (key, pk))
+            if i < len(self._entries) and self._entries[i] == (key, pk):
+                del self._entries[i]
+
+    # incremental updates (no-op until the index has been built)
+    def update(self, product):
+        with self._lock:
+            if self._entries is None:
+                return
+            self._remove_unlocked(product.pk)
+            self._names[product.pk] = product.name
+            for key in self._keys(product.name):
+                bisect.insort(self._entries, (key, product.pk))
+
+    def remove(self, pk):
+        with self._lock:
+            if self._entries is not None:
+                self._remove_unlocked(pk)
+
+    # full rebuild on next lookup (after bulk writes that don't send per-row signals)
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,83 @@
+from .models import Product
+from .cache import get_product_cache
+from .serializers import ProductFastSerializer
+
+
+MAX_IDS = 1000  # ids accepted per request
+CHUNK_SIZE = 200  # ids per IN (...) query
+
+
+# cache key for one product's serialized form; updated_at makes entries self-invalidating,
+# so unrelated catalog writes don't evict them (unlike the versioned response cache)
+def product_cache_key(pk, updated_at):
+    return f"shop:product:{pk}:{updated_at.timestamp()}"
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# normalize requested ids: ints > 0, duplicates removed, request order kept, junk skipped
+def clean_ids(raw_ids):
+    seen = {}
+    for value in raw_ids:
+        try:
+            pk = int(value)
+        except (ValueError, TypeError):
+            continue  # skip invalid ids
+        if pk > 0:
+            seen.setdefault(pk, None)
+    return list(seen)
+
+
+# serialized products for ids, in the given order, plus the ids that don't exist.
+# one (id, updated_at) query per chunk finds existing rows and their versions, cache hits are
+# served as is, and only the misses are loaded (one query per chunk of misses)
+def fetch_products(ids):
+    versions = {}
+    for chunk in _chunks(ids, CHUNK_SIZE):
+        versions.update(Product.objects.filter(id__in=chunk).values_list('id', 'updated_at'))
+
+    found, misses = _from_cache(ids, versions)
+    serializer = ProductFastSerializer()
+    rows = []
+    for chunk in _chunks(misses, CHUNK_SIZE):
+        rows.extend(serializer.values(Product.objects.filter(id__in=chunk), extra=('updated_at',)))
+    return _finish(ids, found, serializer, rows)
+
+
+# same as fetch_products, with the async ORM (for async_views.py)
+async def afetch_products(ids):
+    versions = {}
+    for chunk in _chunks(ids, CHUNK_SIZE):
+        versions.update([pair async for pair in Product.objects.filter(id__in=chunk).values_list('id', 'updated_at')])
+
+    found, misses = _from_cache(ids, versions)
+    serializer = ProductFastSerializer()
+    rows = []
+    for chunk in _chunks(misses, CHUNK_SIZE):
+        rows.extend([row async for row in serializer.values(Product.objects.filter(id__in=chunk), extra=('updated_at',))])
+    return _finish(ids, found, serializer, rows)
+
+
+# ({id: cached data}, [existing ids not in cache])
+def _from_cache(ids, versions):
+    keys = {pk: product_cache_key(pk, updated_at) for pk, updated_at in versions.items()}
+    cached = get_product_cache().get_many(list(keys.values()))
+    found = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    return found, [pk for pk in ids if pk in versions and pk not in found]
+
+
+# serialize + cache freshly loaded rows, then put everything in request order
+def _finish(ids, found, serializer, rows):
+    fresh = {}
+    for row, data in zip(rows, serializer.to_representation(rows)):
+        found[row['id']] = data
+        fresh[product_cache_key(row['id'], row['updated_at'])] = data
+    if fresh:
+        get_product_cache().set_many(fresh)
+
+    products = [found[pk] for pk in ids if pk in found]
+    missing = [pk for pk in ids if pk not in found]
+    return products, missing
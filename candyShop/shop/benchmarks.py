@@ -0,0 +1,137 @@
+import http.client
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from urllib.parse import urlsplit
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases
+from . import cache
+from .models import Product, Category
+
+
+# helpers shared by the bench_* management commands
+
+
+# runs the block against a throwaway test database (test_<NAME> on postgres, in-memory on sqlite),
+# so benchmarks never write synthetic rows into the real catalog
+@contextmanager
+def benchmark_database():
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+# every request in the block misses the response (and per-product) cache: swaps in a backend that keeps nothing.
+# the catalog version doesn't change, so the search index and category cache stay warm
+@contextmanager
+def response_cache_disabled():
+    backends = cache.get_cache(), cache.get_product_cache()
+    cache._backend = cache._product_backend = cache.LocalLRUBackend(max_bytes=0)
+    try:
+        yield
+    finally:
+        cache._backend, cache._product_backend = backends
+
+
+# synthetic catalog of `size` products over `categories` categories (adds to what is already there).
+# close_connection=False inside a transaction (tests)
+def seed_catalog(size, categories=10, batch_size=5000, seed=0, close_connection=True):
+    rng = random.Random(seed)
+    category_ids = [
+        Category.objects.get_or_create(name=f'bench-category-{i}')[0].pk for i in range(categories)
+    ]
+    words = ['sour', 'sweet', 'gummy', 'chocolate', 'mint', 'caramel', 'fruit', 'jelly', 'toffee', 'lolly']
+
+    start = Product.objects.count()
+    for offset in range(0, size, batch_size):
+        Product.objects.bulk_create([
+            Product(
+                name=f'{rng.choice(words).title()} {rng.choice(words)} #{start + i}',
+                description=' '.join(rng.choice(words) for _ in range(30)),
+                price=Decimal(rng.randint(50, 5000)) / 100,
+                price_id=f'price_bench_{start + i}',
+                image_url=f'https://example.com/images/{start + i}.png',
+                category_id=rng.choice(category_ids),
+            )
+            for i in range(offset, min(offset + batch_size, size))
+        ])
+    if close_connection:
+        connection.close()  # drop cached statement state after the big insert
+
+
+# best-of-N wall time of fn() in seconds (best-of reduces scheduler noise)
+def best_time(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# value at percentile p (0-100) of an already sorted list
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# fires `total` requests at url from `concurrency` threads, each keeping one keep-alive connection.
+# returns throughput and latency stats: {"requests", "errors", "seconds", "rps", "p50_ms", "p99_ms"}
+def run_load(url, concurrency=50, total=5000, method='GET', body=None, headers=None):
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+    headers = {'Content-Type': 'application/json', **(headers or {})} if body is not None else (headers or {})
+
+    remaining = itertools.count()
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker():
+        conn = connection_class(parts.netloc, timeout=30)
+        local_latencies, local_errors = [], 0
+        while next(remaining) < total:
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500 or response.status == 429:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = connection_class(parts.netloc, timeout=30)  # reconnect and keep going
+            local_latencies.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "seconds": round(seconds, 3),
+        "rps": round(len(latencies) / seconds, 1) if seconds else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
@@ -0,0 +1,254 @@
+import csv
+import io
+import json
+import time
+from django.db import DatabaseError, transaction
+from rest_framework.exceptions import ValidationError
+from django.utils import timezone
+from .models import Product, Category, HAS_PRICE_ID
+from .serializers import ProductSerializer, ProductImportSerializer, ProductImportListSerializer
+from .pagination import InvalidParameter
+from .cache import category_cache
+from .signals import catalog_changed
+from .reservations import parse_stock_delta, adjust_stock
+
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000  # keep the report small for badly broken files
+MAX_BULK_IDS = 10000  # ids accepted by bulk delete/update in one request
+
+# columns written on upsert (id/created_at are never overwritten)
+UPSERT_FIELDS = ['name', 'description', 'price', 'price_id', 'image_url', 'category', 'updated_at']
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+# file format from explicit value or file name extension
+def detect_format(file_format=None, filename=''):
+    file_format = (file_format or filename.rsplit('.', 1)[-1]).lower()
+    if file_format in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if file_format == 'csv':
+        return 'csv'
+    raise ImportFormatError("Unsupported format, use 'jsonl' or 'csv'.")
+
+
+# yields (row_number, dict or None if unparseable) without loading the whole file
+def iter_rows(stream, file_format):
+    if isinstance(stream, (io.TextIOBase, io.StringIO)):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig')  # binary upload -> text, strips BOM
+
+    if file_format == 'csv':
+        for row_number, row in enumerate(csv.DictReader(text), start=1):
+            # empty cells mean "not provided", so model defaults / existing values apply
+            yield row_number, {key: value for key, value in row.items() if key and value not in ('', None)}
+    else:
+        row_number = 0
+        for line in text:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row_number, row if isinstance(row, dict) else None
+
+
+# validate + write one batch: new rows via bulk_create, rows whose price_id already exists via bulk_update
+def _import_batch(batch, report):
+    parsed = []
+    for row_number, row in batch:
+        if row is None:
+            _add_error(report, row_number, {"non_field_errors": ["Invalid JSON object."]})
+        else:
+            parsed.append((row_number, row))
+
+    serializer = ProductImportListSerializer(child=ProductImportSerializer(), data=[row for _, row in parsed])
+    serializer.is_valid()
+    for index, errors in serializer.row_errors.items():
+        _add_error(report, parsed[index][0], errors)
+
+    # first row wins for a price_id repeated inside the batch, the later ones are reported as failed
+    rows, seen = [], {}
+    for index, attrs in serializer.validated_data:
+        row_number, price_id = parsed[index][0], attrs.get('price_id')
+        if price_id in seen:
+            _add_error(report, row_number, {"price_id": [f"Duplicate price_id, already in row {seen[price_id]}."]})
+            continue
+        if price_id:
+            seen[price_id] = row_number
+        rows.append((row_number, attrs))
+
+    try:
+        created, updated = _write_rows(rows)
+    except (DatabaseError, ValidationError):
+        # e.g. a missing default category, a price_id inserted concurrently or a stock_delta taking
+        # more than is in stock. earlier batches are committed already, so retry this one row by row
+        # and report only the rows that are refused
+        created = updated = 0
+        for row_number, attrs in rows:
+            try:
+                row_created, row_updated = _write_rows([(row_number, attrs)])
+            except ValidationError as e:
+                _add_error(report, row_number, e.detail)
+            except DatabaseError as e:
+                _add_error(report, row_number, {"non_field_errors": [f"Database error: {e}"]})
+            else:
+                created, updated = created + row_created, updated + row_updated
+
+    report['created'] += created
+    report['updated'] += updated
+
+
+# upserts [(row_number, attrs)] in one transaction, returns (created, updated).
+# stock_delta is the initial stock of a new row and added with adjust_stock to an existing one
+# (one UPDATE per such row). raises ValidationError when a row's stock would go negative
+def _write_rows(rows):
+    now = timezone.now()
+    with transaction.atomic():
+        keyed = [attrs for _, attrs in rows if attrs.get('price_id')]
+        existing = {
+            product.price_id: product
+            for product in Product.objects.filter(HAS_PRICE_ID, price_id__in=[attrs['price_id'] for attrs in keyed])
+        }
+        to_update, to_create, deltas = [], [], []
+        for _, attrs in rows:
+            attrs = dict(attrs)
+            delta = attrs.pop('stock_delta', 0)
+            product = existing.get(attrs.get('price_id'))
+            if product is None:
+                if delta < 0:
+                    raise ValidationError({"stock_delta": ["A new product can't start with negative stock."]})
+                to_create.append(Product(**attrs, stock=delta))
+                continue
+            for field, value in attrs.items():
+                setattr(product, field, value)
+            product.updated_at = now  # auto_now isn't applied by bulk_update
+            to_update.append(product)
+            if delta:
+                deltas.append((product.pk, delta))
+
+        Product.objects.bulk_create(to_create)
+        Product.objects.bulk_update(to_update, UPSERT_FIELDS)  # stock isn't written, see deltas
+        for pk, delta in deltas:
+            if not adjust_stock(Product.objects.filter(pk=pk), delta):
+                raise ValidationError({"stock_delta": [f"Not enough stock to remove {-delta} units."]})
+    return len(to_create), len(to_update)
+
+
+def _add_error(report, row_number, errors):
+    report['failed'] += 1
+    if len(report['errors']) < MAX_REPORTED_ERRORS:
+        report['errors'].append({"row": row_number, "errors": errors})
+
+
+# stream-parse a JSON Lines / CSV file and upsert products keyed on price_id.
+# returns a report: row counts, per-row errors and throughput
+def import_products(stream, file_format, batch_size=DEFAULT_BATCH_SIZE):
+    report = {"rows": 0, "created": 0, "updated": 0, "failed": 0, "errors": []}
+    started = time.perf_counter()
+
+    batch = []
+    try:
+        for row_number, row in iter_rows(stream, file_format):
+            report['rows'] += 1
+            batch.append((row_number, row))
+            if len(batch) >= batch_size:
+                _import_batch(batch, report)
+                batch = []
+        if batch:
+            _import_batch(batch, report)
+    finally:
+        if report['created'] or report['updated']:
+            catalog_changed.send(sender=Product, bulk=True)  # bulk writes don't fire model signals
+
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    report['rows_per_second'] = round(report['rows'] / report['seconds'], 1) if report['seconds'] else None
+    return report
+
+
+# -- set-based bulk delete / update --
+
+# products selected by request body {"ids": [...]} and/or {"category": "name"} (both = intersection).
+# raises InvalidParameter for bad input, Category.DoesNotExist for unknown category
+def select_products(data):
+    ids = data.get('ids')
+    category_name = data.get('category')
+    if ids is None and not category_name:
+        raise InvalidParameter("Provide 'ids' and/or 'category'.")
+
+    products = Product.objects.all()
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            raise InvalidParameter("'ids' must be a non-empty list.")
+        if len(ids) > MAX_BULK_IDS:
+            raise InvalidParameter(f"Too many IDs provided. Maximum allowed is {MAX_BULK_IDS}.")
+        try:
+            ids = {int(value) for value in ids}
+        except (TypeError, ValueError):
+            raise InvalidParameter("'ids' must contain integers only.")
+        products = products.filter(id__in=ids)
+
+    if category_name:
+        category_id = category_cache.get_id(category_name)
+        if category_id is None:
+            raise Category.DoesNotExist
+        products = products.filter(category_id=category_id)
+    return products
+
+
+# one DELETE for the selection, returns number of deleted products
+def bulk_delete_products(products):
+    with transaction.atomic():
+        _, deleted = products.delete()
+    return deleted.get(Product._meta.label, 0)
+
+
+# fields one value can't be set on many rows: price_id is unique per product (changed per product
+# with update_product), stock is moved by reservations so it's only changed relatively (stock_delta)
+NOT_BULK_UPDATABLE = {
+    'price_id': "This field can't be changed in a bulk update, use update_product.",
+    'stock': "Stock is changed with stock_delta (units to add, negative to remove).",
+}
+
+
+# validates changes like a partial product update, then applies them with a single UPDATE.
+# {"stock_delta": n} adds n units to every selected product (adjust_stock); a negative delta
+# changes nothing unless every selected product has enough stock.
+# returns (updated_count, None) or (None, validation_errors)
+def bulk_update_products(products, changes):
+    if not isinstance(changes, dict) or not changes:
+        raise InvalidParameter("'changes' must be a non-empty object.")
+
+    rejected = {name: [message] for name, message in NOT_BULK_UPDATABLE.items() if name in changes}
+    if rejected:
+        return None, rejected
+
+    changes = dict(changes)
+    delta = parse_stock_delta(changes.pop('stock_delta')) if 'stock_delta' in changes else 0
+
+    serializer = ProductSerializer(data=changes, partial=True)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    if not serializer.validated_data and not delta:
+        raise InvalidParameter("'changes' has no updatable fields.")
+
+    updated = 0
+    with transaction.atomic():
+        if serializer.validated_data:
+            updated = products.update(**serializer.validated_data, updated_at=timezone.now())  # auto_now isn't applied by update()
+        if delta:
+            selected = updated if serializer.validated_data else products.count()
+            adjusted = adjust_stock(products, delta)
+            if adjusted < selected:
+                transaction.set_rollback(True)
+                return None, {"stock_delta": [f"{selected - adjusted} of the selected products have less than {-delta} units in stock."]}
+            updated = adjusted
+    if updated and serializer.validated_data:
+        catalog_changed.send(sender=Product, bulk=True)  # QuerySet.update() doesn't fire model signals
+    return updated, None
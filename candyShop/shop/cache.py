@@ -0,0 +1,434 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .models import Category, CatalogVersion
+from .routers import read_from_replica, pinned_to_primary
+from .timing import render_timer
+
+
+# in-process category name -> id map, so "?category=" filters don't need a Category query per request.
+# invalidated by Category save/delete signals (see signals.py); the TTL bounds staleness for
+# changes made by other worker processes. unknown names/ids are remembered too (for MISS_TTL, at
+# most MAX_MISSES of them), so requests for a made-up category don't reload the table every time
+class CategoryCache:
+    TTL = 300  # seconds
+    MISS_TTL = 10  # seconds, how long a category created by another worker can look missing
+    MAX_MISSES = 10000
+
+    def __init__(self):
+        self._ids = None
+        self._loaded_at = 0.0
+        self._misses = {}  # name or id -> time it was found missing
+        self._lock = threading.Lock()
+
+    # returns category id for name, or None if there is no such category
+    def get_id(self, name):
+        ids = self._ids
+        if self._stale(ids) or (name not in ids and not self._known_missing(name)):
+            ids = self._load()  # (re)load whole table on miss, categories are a tiny table
+            self._remember_miss(name, ids)
+        return ids.get(name)
+
+    # True if a category with this id exists
+    def has_id(self, pk):
+        ids = self._ids
+        if self._stale(ids) or (pk not in ids.values() and not self._known_missing(pk)):
+            ids = self._load()
+            self._remember_miss(pk, ids.values())
+        return pk in ids.values()
+
+    # same as get_id, for async views (loads with the async ORM)
+    async def aget_id(self, name):
+        ids = self._ids
+        if self._stale(ids) or (name not in ids and not self._known_missing(name)):
+            ids = {category_name: pk async for category_name, pk in Category.objects.values_list('name', 'id')}
+            self._ids, self._loaded_at, self._misses = ids, time.monotonic(), {}
+            self._remember_miss(name, ids)
+        return ids.get(name)
+
+    def _stale(self, ids):
+        return ids is None or time.monotonic() - self._loaded_at > self.TTL
+
+    def _known_missing(self, key):
+        missed_at = self._misses.get(key)
+        return missed_at is not None and time.monotonic() - missed_at < self.MISS_TTL
+
+    def _remember_miss(self, key, found):
+        if key not in found:
+            if len(self._misses) >= self.MAX_MISSES:
+                self._misses = {}  # plenty of junk names, start over
+            self._misses[key] = time.monotonic()
+
+    def _load(self):
+        with self._lock:
+            ids = dict(Category.objects.values_list('name', 'id'))
+            self._ids = ids
+            self._loaded_at = time.monotonic()
+            self._misses = {}  # fresh table, earlier misses are rechecked against it
+            return ids
+
+    def invalidate(self):
+        self._ids = None
+        self._misses = {}
+
+
+category_cache = CategoryCache()
+
+
+# -- response cache backends --
+# a backend stores opaque values by key. the catalog version the entries are keyed on must be the
+# same in every worker process, so by default it is the CatalogVersion row in the primary database
+# (one pk lookup per request); DjangoCacheBackend keeps it in its cache instead when that cache is
+# shared. versions start from a millisecond timestamp, so a lost counter never goes back to a
+# number that old (stale) entries were stored under
+class BaseCacheBackend:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, timeout=None):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    # {key: value} for the keys found, backends with a bulk fetch should override these
+    def get_many(self, keys):
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def set_many(self, mapping, timeout=None):
+        for key, value in mapping.items():
+            self.set(key, value, timeout)
+
+    def get_version(self):
+        return self.get_state()[0]
+
+    # (catalog version, timestamp of the last catalog write or None)
+    def get_state(self):
+        row = version_row().values_list('version', 'changed_at').first()
+        if row is None:
+            self.bump_version()  # first use (or the row was deleted)
+            row = version_row().values_list('version', 'changed_at').first()
+        return row[0], row[1].timestamp()
+
+    async def aget_state(self):
+        row = await version_row().values_list('version', 'changed_at').afirst()
+        if row is None:
+            await sync_to_async(self.bump_version)()
+            row = await version_row().values_list('version', 'changed_at').afirst()
+        return row[0], row[1].timestamp()
+
+    def bump_version(self):
+        now = timezone.now()
+        if not version_row().update(version=F('version') + 1, changed_at=now):
+            CatalogVersion.objects.using('default').get_or_create(
+                pk=CATALOG_VERSION_PK, defaults={'version': int(time.time() * 1000), 'changed_at': now},
+            )
+
+
+CATALOG_VERSION_PK = 1
+
+
+# always the primary: a lagging replica would hand out an old version
+def version_row():
+    return CatalogVersion.objects.using('default').filter(pk=CATALOG_VERSION_PK)
+
+
+# rough memory held by a cached value: its bytes/strings plus a flat overhead per object
+def value_size(value):
+    if isinstance(value, (bytes, str)):
+        return len(value) + 50
+    if isinstance(value, (tuple, list)):
+        return 50 + sum(value_size(item) for item in value)
+    if isinstance(value, dict):
+        return 50 + sum(value_size(key) + value_size(item) for key, item in value.items())
+    return 50
+
+
+# bounded LRU in process memory (default). every worker keeps its own entries, keyed on the shared
+# version, so a write in any worker retires the entries of all of them. bounded by entry count and
+# by the total size of the stored values (max_bytes, catalog bodies can be megabytes each)
+class LocalLRUBackend(BaseCacheBackend):
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, timeout=300):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout  # default entry lifetime in seconds (None = no expiry)
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self._bytes -= size
+                return None
+            self._data.move_to_end(key)  # mark as recently used
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        size = value_size(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size > self.max_bytes:
+                return  # would evict everything else
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._bytes -= self._data.popitem(last=False)[1][2]  # evict least recently used
+
+    def delete(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+# False for caches that live in each process (locmem, CACHES' default without CACHE_URL) or store nothing
+def is_shared_cache(django_cache):
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+    return not isinstance(django_cache, (LocMemCache, DummyCache))
+
+
+# stores entries in a django cache alias (CACHES setting), e.g. redis via CACHE_URL=redis://...
+# any cache shared between workers keeps them all consistent and also holds the catalog version.
+# CACHES falls back to a per-process locmem cache without CACHE_URL, the version stays in the
+# database then
+class DjangoCacheBackend(BaseCacheBackend):
+    VERSION_KEY = 'shop:catalog_version'
+
+    def __init__(self, alias='default', timeout=300):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.shared = is_shared_cache(self.cache)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(key, value, self.timeout if timeout is None else timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)  # one round trip
+
+    def set_many(self, mapping, timeout=None):
+        self.cache.set_many(mapping, self.timeout if timeout is None else timeout)
+
+    def get_state(self):
+        if not self.shared:
+            return super().get_state()
+        state = self.cache.get_many([self.VERSION_KEY, CHANGED_AT_KEY])
+        version = state.get(self.VERSION_KEY)
+        if version is None:
+            self.cache.add(self.VERSION_KEY, int(time.time() * 1000), None)
+            version = self.cache.get(self.VERSION_KEY)
+        return version, state.get(CHANGED_AT_KEY)
+
+    async def aget_state(self):
+        if not self.shared:
+            return await super().aget_state()
+        return self.get_state()  # blocks briefly, like the entry reads
+
+    def bump_version(self):
+        if not self.shared:
+            return super().bump_version()
+        self.cache.set(CHANGED_AT_KEY, time.time(), None)
+        try:
+            self.cache.incr(self.VERSION_KEY)
+        except ValueError:  # counter missing (evicted / never set)
+            self.cache.set(self.VERSION_KEY, int(time.time() * 1000), None)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# configured backend (settings.SHOP_CACHE_BACKEND / SHOP_CACHE_OPTIONS), created on first use
+def get_cache():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend_class = import_string(getattr(settings, 'SHOP_CACHE_BACKEND', 'shop.cache.LocalLRUBackend'))
+                _backend = backend_class(**getattr(settings, 'SHOP_CACHE_OPTIONS', {}))
+    return _backend
+
+
+_product_backend = None
+
+
+# per-product entries (get_multiple_products, see batch.py) get an LRU of their own with
+# LocalLRUBackend, so a few large carts can't push the catalog pages out of the response LRU
+# (sized by SHOP_PRODUCT_CACHE_OPTIONS). a shared django cache holds both, it evicts on its own
+def get_product_cache():
+    global _product_backend
+    if _product_backend is None:
+        backend = get_cache()
+        with _backend_lock:
+            if _product_backend is None:
+                if isinstance(backend, LocalLRUBackend):
+                    options = {'timeout': backend.timeout, **getattr(settings, 'SHOP_PRODUCT_CACHE_OPTIONS', {})}
+                    _product_backend = LocalLRUBackend(**options)
+                else:
+                    _product_backend = backend
+    return _product_backend
+
+
+CHANGED_AT_KEY = 'shop:catalog_changed_at'
+
+
+# called (through the catalog_changed signal) after every product/category write
+def bump_catalog_version():
+    get_cache().bump_version()
+
+
+# (version, changed_at) for this request, read once and reused by every cache layer it passes
+# through (validators, response cache), so one request always sees a single version
+def catalog_state(request):
+    state = getattr(request, 'shop_catalog_state', None)
+    if state is None:
+        state = request.shop_catalog_state = get_cache().get_state()
+    return state
+
+
+async def acatalog_state(request):
+    state = getattr(request, 'shop_catalog_state', None)
+    if state is None:
+        state = request.shop_catalog_state = await get_cache().aget_state()
+    return state
+
+
+# timeout for a new versioned entry (None = backend default). right after a write the read
+# replica may still serve pre-write rows, so entries built from replica reads in that window
+# only live until the replica has caught up (REPLICA_PIN_SECONDS)
+def entry_timeout(changed_at):
+    if not read_from_replica.get():
+        return None
+    window = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+    age = time.time() - (changed_at or 0)
+    return max(1, int(window - age)) if age < window else None
+
+
+# what identifies a response: the path plus only the query parameters the view reads, in a fixed
+# order (+ body for POST lookups). anything else in the query string is ignored, so made-up
+# parameters can't multiply the cache entries
+def request_signature(request, params=()):
+    signature = request.path + '?' + urlencode([(name, value) for name in params for value in request.GET.getlist(name)])
+    if request.method not in ('GET', 'HEAD'):
+        signature += '|' + json.dumps(request.data, sort_keys=True, default=str)
+    return signature
+
+
+# key = catalog version + request signature, hashed to keep it short and cache-safe
+def response_cache_key(request, version, prefix='response', params=()):
+    return f"shop:{prefix}:{version}:{hashlib.sha1(request_signature(request, params).encode()).hexdigest()}"
+
+
+# decorator for public read views: serves the rendered JSON bytes straight from the cache,
+# skipping the ORM and serializers. entries are keyed by catalog version, so any write
+# makes every older entry unreachable (no stale reads, no explicit purging).
+# params: the query parameters the view reads (see request_signature), e.g.
+#   @cache_response('search_product', 'limit', 'offset')
+# clients pinned to the primary (read-your-writes) always get a freshly built response.
+# put it below @api_view/@permission_classes so auth, permissions and parsing still run first
+def cache_response(*params):
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if pinned_to_primary.get():
+                return view_func(request, *args, **kwargs)
+
+            cache = get_cache()
+            version, changed_at = catalog_state(request)
+            key = response_cache_key(request, version, params=params)
+            timeout = entry_timeout(changed_at)
+
+            cached = cache.get(key)
+            if cached is not None:
+                status_code, body = cached
+                return cached_response(body, status_code, key, timeout)
+
+            response = view_func(request, *args, **kwargs)
+
+            # only cache deterministic results (found / not found), never server errors
+            if isinstance(response, Response) and response.status_code in (200, 404):
+                with render_timer():
+                    body = JSONRenderer().render(response.data)
+                cache.set(key, (response.status_code, body), timeout)
+                return cached_response(body, response.status_code, key, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+# the cache key (and entry timeout) travel with the response, so CompressionMiddleware can store
+# and reuse the compressed body under it (same catalog version = same bytes, compressed once)
+def cached_response(body, status_code, key, timeout):
+    response = HttpResponse(body, status=status_code, content_type='application/json')
+    response.shop_cache_key = key
+    response.shop_cache_timeout = timeout
+    return response
+
+
+# async version of cache_response for the plain async views in async_views.py
+# (the view returns an HttpResponse with a JSON body). cache calls are in-memory for
+# LocalLRUBackend; DjangoCacheBackend calls block briefly like the sync path does
+def acache_response(*params):
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if pinned_to_primary.get():
+                return await view_func(request, *args, **kwargs)
+
+            cache = get_cache()
+            version, changed_at = await acatalog_state(request)
+            key = response_cache_key(request, version, prefix='async', params=params)
+            timeout = entry_timeout(changed_at)
+
+            cached = cache.get(key)
+            if cached is not None:
+                status_code, body = cached
+                return cached_response(body, status_code, key, timeout)
+
+            response = await view_func(request, *args, **kwargs)
+            if response.status_code in (200, 404):
+                cache.set(key, (response.status_code, response.content), timeout)
+                response.shop_cache_key = key
+                response.shop_cache_timeout = timeout
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,43 @@
+import gzip
+
+try:
+    import brotli  # optional, better ratio than gzip for JSON
+except ImportError:
+    brotli = None
+
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # higher qualities cost a lot more cpu on multi-megabyte catalog bodies
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+# encodings we can produce, best first
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+# picks the response encoding from an Accept-Encoding header ("gzip, deflate, br;q=0.9"), None = identity
+def negotiate_encoding(header):
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.partition(';')
+        name, quality = name.strip().lower(), 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name] = quality
+
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)  # mtime=0: same input, same bytes
@@ -0,0 +1,143 @@
+import hashlib
+import time
+from functools import wraps
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .cache import get_cache, catalog_state, acatalog_state, request_signature, entry_timeout
+from .routers import pinned_to_primary
+
+
+# scope for responses validated by the catalog version alone: search results and cursor pages
+# would need an aggregate over the whole catalog/category, a scan per distinct query. any write
+# bumps the version, so their etags change with it without any query
+CATALOG_VERSION = object()
+
+
+# validators for a response: (etag, last_modified timestamp), either may be None.
+# for a queryset scope the etag is a cheap aggregate over the rows the response is built from
+# (scope_stats), memoized per catalog version and scope so signatures sharing a scope run it
+# once (except for clients pinned to the primary, the memo may come from replica reads).
+# the request signature (path + the params the view reads) covers fields/pagination
+def catalog_validators(request, scope, params=()):
+    version, changed_at = catalog_state(request)
+    signature = request_signature(request, params)
+    if scope is CATALOG_VERSION:
+        if entry_timeout(changed_at) is not None:
+            return None, None  # the replica may still answer with pre-write rows, don't validate those
+        return make_etag(f"{version}:{signature}"), catalog_last_modified(changed_at)
+
+    cache = get_cache()
+    key = f"shop:validators:{version}:{hashlib.sha1(str(scope.query).encode()).hexdigest()}"
+    pinned = pinned_to_primary.get()
+
+    stats = None if pinned else cache.get(key)
+    if stats is None:
+        stats = scope_stats(scope)
+        if not pinned:
+            cache.set(key, stats, entry_timeout(changed_at))
+    return make_etag(f"{stats}:{signature}"), catalog_last_modified(changed_at)
+
+
+# same as catalog_validators, for the async views (async ORM)
+async def acatalog_validators(request, scope, params=()):
+    version, changed_at = await acatalog_state(request)
+    signature = request_signature(request, params)
+    if scope is CATALOG_VERSION:
+        if entry_timeout(changed_at) is not None:
+            return None, None
+        return make_etag(f"{version}:{signature}"), catalog_last_modified(changed_at)
+
+    cache = get_cache()
+    key = f"shop:validators:{version}:{hashlib.sha1(str(scope.query).encode()).hexdigest()}"
+    pinned = pinned_to_primary.get()
+
+    stats = None if pinned else cache.get(key)
+    if stats is None:
+        stats = format_stats(await scope.order_by().aaggregate(**STATS))
+        if not pinned:
+            cache.set(key, stats, entry_timeout(changed_at))
+    return make_etag(f"{stats}:{signature}"), catalog_last_modified(changed_at)
+
+
+# max(updated_at) catches edits, count catches inserts/deletes
+STATS = {'last_updated': Max('updated_at'), 'count': Count('id')}
+
+
+def scope_stats(queryset):
+    return format_stats(queryset.order_by().aggregate(**STATS))
+
+
+def format_stats(stats):
+    last_updated = stats['last_updated']
+    return f"{last_updated.isoformat() if last_updated else ''}:{stats['count']}"
+
+
+def make_etag(raw):
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+# Last-Modified is the time of the last catalog write, which never goes backwards (max(updated_at)
+# of the rows does when the newest product is deleted or moves to another category).
+# http dates have whole seconds, so it is left out during the second of a write: a second write
+# within that same second would otherwise get the same date and If-Modified-Since would miss it
+def catalog_last_modified(changed_at):
+    if changed_at is None or time.time() - changed_at < 1:
+        return None
+    return int(changed_at)
+
+
+# decorator for GET views: answers If-None-Match / If-Modified-Since with 304 before the view
+# (and its serializer) runs, and adds ETag / Last-Modified to full responses.
+# scope(request, *args, **kwargs) returns the queryset the response is built from, CATALOG_VERSION,
+# or None to skip (e.g. unknown category, the view will produce the error response).
+# params as for cache_response.
+# put it above @cache_response so a 304 doesn't even read the response cache
+def condition_on_catalog(scope, params=()):
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            rows = scope(request, *args, **kwargs)
+            if rows is None:
+                return view_func(request, *args, **kwargs)
+
+            etag, last_modified = catalog_validators(request, rows, params)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified  # 304 (or 412 for failed If-Match)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                if etag is not None:
+                    response.headers['ETag'] = etag
+                if last_modified is not None:
+                    response.headers['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
+
+
+# async version of condition_on_catalog for the plain async views in async_views.py,
+# scope is an async function there (category names are resolved with the async ORM)
+def acondition_on_catalog(scope, params=()):
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            rows = await scope(request, *args, **kwargs)
+            if rows is None:
+                return await view_func(request, *args, **kwargs)
+
+            etag, last_modified = await acatalog_validators(request, rows, params)
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                return not_modified
+
+            response = await view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                if etag is not None:
+                    response.headers['ETag'] = etag
+                if last_modified is not None:
+                    response.headers['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
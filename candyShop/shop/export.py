@@ -0,0 +1,39 @@
+from .models import Product
+from .serializers import ProductFastSerializer, render_json
+
+
+DEFAULT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+# yields the whole catalog as bytes, one chunk per `chunk_size` products.
+# rows come from a server-side cursor (.iterator()), so memory stays flat whatever the catalog size.
+# 'ndjson' = one product per line, 'json' = a single JSON array written incrementally
+def iter_catalog(file_format='ndjson', chunk_size=DEFAULT_CHUNK_SIZE):
+    serializer = ProductFastSerializer()  # same output as the public product responses (no stock)
+    separator = b'\n' if file_format == 'ndjson' else b','
+
+    if file_format == 'json':
+        yield b'['
+
+    buffer, first = [], True
+    for row in serializer.values(Product.objects.order_by('id')).iterator(chunk_size=chunk_size):
+        buffer.append(row)
+        if len(buffer) >= chunk_size:
+            yield _render_chunk(serializer, buffer, separator, first, file_format)
+            buffer, first = [], False
+    if buffer:
+        yield _render_chunk(serializer, buffer, separator, first, file_format)
+
+    if file_format == 'json':
+        yield b']'
+
+
+def _render_chunk(serializer, rows, separator, first, file_format):
+    chunk = separator.join(render_json(item) for item in serializer.to_representation(rows))
+    if file_format == 'ndjson':
+        return chunk + b'\n'
+    return chunk if first else b',' + chunk
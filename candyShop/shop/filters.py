@@ -0,0 +1,99 @@
+from decimal import Decimal, InvalidOperation
+from django.db.models import Count, Min, Max
+from .models import Product
+from .pagination import CursorPaginator, PriceCursorPaginator, InvalidParameter
+
+
+# product_list query parameters (besides fields/limit/cursor):
+#   ?category=gummies&category=chocolate  -> products in any of these categories
+#   ?min_price=1.50&max_price=10          -> inclusive price range
+#   ?sort=newest|price|-price             -> order (no sort = unordered, as before)
+#   ?facets=1                             -> add category counts and price range to the response
+class ProductListParams:
+    # every query parameter product_list reads (the response cache keys on these only)
+    QUERY_PARAMS = ('fields', 'limit', 'cursor', 'category', 'min_price', 'max_price', 'sort', 'facets')
+
+    SORTS = {
+        'newest': ('-created_at', '-id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
+    def __init__(self, request):
+        self.categories = [name for name in request.GET.getlist('category') if name]
+        self.min_price = self.parse_price(request.GET.get('min_price'), 'min_price')
+        self.max_price = self.parse_price(request.GET.get('max_price'), 'max_price')
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise InvalidParameter("'min_price' must not be greater than 'max_price'.")
+
+        self.sort = request.GET.get('sort') or None
+        if self.sort is not None and self.sort not in self.SORTS:
+            raise InvalidParameter(f"'sort' must be one of: {', '.join(self.SORTS)}.")
+
+        self.facets = request.GET.get('facets', '').lower() in ('1', 'true', 'yes')
+
+    @staticmethod
+    def parse_price(raw, name):
+        if raw in (None, ''):
+            return None
+        try:
+            price = Decimal(raw)
+        except InvalidOperation:
+            raise InvalidParameter(f"'{name}' must be a number.")
+        if not price.is_finite() or price < 0:
+            raise InvalidParameter(f"'{name}' must be a non-negative number.")
+        return price
+
+    # price range only (facet counts are computed over this, across all categories)
+    def filter_price(self, queryset):
+        if self.min_price is not None:
+            queryset = queryset.filter(price__gte=self.min_price)
+        if self.max_price is not None:
+            queryset = queryset.filter(price__lte=self.max_price)
+        return queryset
+
+    # price range + categories, category_ids as resolved from self.categories (None = all categories)
+    def filter(self, queryset, category_ids):
+        queryset = self.filter_price(queryset)
+        if category_ids is not None:
+            queryset = queryset.filter(category_id__in=category_ids)
+        return queryset
+
+    def order(self, queryset):
+        return queryset.order_by(*self.SORTS[self.sort]) if self.sort else queryset
+
+    # keyset paginator matching the sort (newest first unless sorting by price)
+    def paginator(self, request):
+        if self.sort in ('price', '-price'):
+            return PriceCursorPaginator(request, descending=self.sort == '-price')
+        return CursorPaginator(request)
+
+
+# one grouped query: product count and price range per category, for products in the price range
+def facet_rows(queryset):
+    return queryset.order_by().values('category_id', 'category__name').annotate(
+        count=Count('id'), min_price=Min('price'), max_price=Max('price'),
+    )
+
+
+# facets from facet_rows(): counts for every category (so the client can show what other
+# categories would add) and the price range of the selected categories
+def build_facets(rows, category_ids):
+    rows = sorted(rows, key=lambda row: row['category__name'])
+    selected = [row for row in rows if category_ids is None or row['category_id'] in category_ids]
+    min_price = min((row['min_price'] for row in selected), default=None)
+    max_price = max((row['max_price'] for row in selected), default=None)
+    return {
+        "categories": [
+            {"id": row['category_id'], "name": row['category__name'], "count": row['count']} for row in rows
+        ],
+        "price": {"min": format_price(min_price), "max": format_price(max_price)},
+    }
+
+
+# same "12.50" format as product prices (aggregates come back unquantized on some databases)
+def format_price(value):
+    if value is None:
+        return None
+    places = Product._meta.get_field('price').decimal_places
+    return str(Decimal(value).quantize(Decimal(1).scaleb(-places)))
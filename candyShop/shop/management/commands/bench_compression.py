@@ -0,0 +1,61 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from shop.benchmarks import benchmark_database, seed_catalog
+from shop.compression import available_encodings, compress
+from shop.models import Product
+from shop.signals import catalog_changed
+
+
+PATHS = {
+    'product_list full': '/shop/products/',
+    'product_list page': '/shop/products/?limit=24',
+}
+
+
+# python manage.py bench_compression [--sizes 1000 10000] [--repeat 20]
+# per catalog size and response: bytes on the wire for identity and each available encoding,
+# cpu time to compress the body once (what every request would pay without reuse), and the
+# mean time of a warm request through CompressionMiddleware (compressed body reused from the cache)
+class Command(BaseCommand):
+    help = 'Measure bytes on the wire and CPU per request for compressed catalog responses.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        unthrottled = {**settings.SHOP_THROTTLE, 'ENABLED': False}  # measure the endpoints, not the rate limits
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=hosts, SHOP_THROTTLE=unthrottled):
+            seeded = 0
+            for size in sorted(options['sizes']):
+                seed_catalog(size - seeded)
+                seeded = size
+                catalog_changed.send(sender=Product, bulk=True)  # bulk_create sends no signals
+                for name, path in PATHS.items():
+                    self.run_path(size, name, path, options['repeat'])
+
+    def run_path(self, size, name, path, repeat):
+        client = Client()
+        body = client.get(path).content  # identity, also warms the response cache
+        self.stdout.write(f"{size:>7} {name:<18} identity {len(body):>10} bytes")
+
+        for encoding in available_encodings():
+            started = time.process_time()
+            for _ in range(repeat):
+                compressed = compress(body, encoding)
+            cpu_ms = (time.process_time() - started) / repeat * 1000
+
+            client.get(path, HTTP_ACCEPT_ENCODING=encoding)  # compress once and store
+            started = time.perf_counter()
+            for _ in range(repeat):
+                response = client.get(path, HTTP_ACCEPT_ENCODING=encoding)
+            warm_ms = (time.perf_counter() - started) / repeat * 1000
+
+            self.stdout.write(
+                f"{'':>26} {encoding:<8} {len(compressed):>10} bytes ({len(compressed) / len(body):6.1%}) | "
+                f"compress {cpu_ms:8.2f} ms cpu | warm request {warm_ms:7.2f} ms "
+                f"({response.get('Content-Encoding') or 'not compressed'})"
+            )
@@ -0,0 +1,88 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+# python manage.py bench_db_connections [--iterations 200]
+# per-request cost of a tiny query with a fresh connection each time (DB_CONN_MODE=none)
+# vs. a reused, health-checked connection (DB_CONN_MODE=persistent) vs. the psycopg pool
+# (DB_CONN_MODE=pool, only when psycopg 3 + psycopg-pool are installed). read-only, runs
+# against the configured database
+class Command(BaseCommand):
+    help = 'Measure per-request database connection overhead for each DB_CONN_MODE.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        alias, iterations = options['database'], options['iterations']
+
+        def fresh_connection():
+            connection = connections.create_connection(alias)
+            connection.settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0, 'OPTIONS': self.options_without_pool(connection)}
+            self.query(connection)
+            connection.close()
+
+        persistent = connections.create_connection(alias)
+        persistent.settings_dict = {**persistent.settings_dict, 'CONN_MAX_AGE': None, 'CONN_HEALTH_CHECKS': True, 'OPTIONS': self.options_without_pool(persistent)}
+
+        def persistent_connection():
+            persistent.close_if_unusable_or_obsolete()  # what django does at request start/end
+            persistent.health_check_done = False
+            self.query(persistent)
+
+        results = {
+            'new connection per request': self.mean_ms(fresh_connection, iterations),
+            'persistent + health check': self.mean_ms(persistent_connection, iterations),
+        }
+        persistent.close()
+
+        pooled = self.pooled_connection(alias)
+        if pooled is not None:
+            def pooled_connection():
+                self.query(pooled)
+                pooled.close()  # returns the connection to the pool
+            results['psycopg pool'] = self.mean_ms(pooled_connection, iterations)
+            pooled.close_pool()
+        else:
+            self.stdout.write('psycopg pool: skipped (needs postgresql with psycopg 3 and psycopg-pool)')
+
+        baseline = results['new connection per request']
+        for name, ms in results.items():
+            self.stdout.write(f"{name:<28} {ms:8.3f} ms/request  (saves {baseline - ms:7.3f} ms vs new connection)")
+
+    @staticmethod
+    def query(connection):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+    @staticmethod
+    def options_without_pool(connection):
+        return {key: value for key, value in connection.settings_dict.get('OPTIONS', {}).items() if key != 'pool'}
+
+    @staticmethod
+    def mean_ms(fn, iterations):
+        fn()  # warm up
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - started) / iterations * 1000
+
+    @staticmethod
+    def pooled_connection(alias):
+        connection = connections.create_connection(alias)
+        if connection.vendor != 'postgresql':
+            return None
+        try:
+            import psycopg_pool  # noqa: F401
+            from django.db.backends.postgresql.psycopg_any import is_psycopg3
+        except ImportError:
+            return None
+        if not is_psycopg3:
+            return None
+        options = {**connection.settings_dict.get('OPTIONS', {})}
+        options.setdefault('pool', True)
+        connection.settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0, 'OPTIONS': options}
+        return connection
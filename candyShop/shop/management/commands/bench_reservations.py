@@ -0,0 +1,83 @@
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, OperationalError
+from shop.benchmarks import benchmark_database, seed_catalog, percentile
+from shop.models import Product, Reservation
+from shop.reservations import reserve, OutOfStock
+
+
+# python manage.py bench_reservations [--buyers 50] [--attempts 40] [--stock 1000] [--products 1]
+# flash sale contention: --buyers threads each try --attempts single-unit reservations of the
+# same --products hot product(s), all in one cart when more than one. reports
+# reservations/second, p50/p99 latency and sold-out answers, and checks nothing was oversold.
+# meant for postgres; sqlite serializes all writers and reports them as retried lock errors
+class Command(BaseCommand):
+    help = 'Measure stock reservation throughput with many concurrent buyers of the same items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=50)
+        parser.add_argument('--attempts', type=int, default=40)
+        parser.add_argument('--stock', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            seed_catalog(options['products'], categories=1)
+            hot = list(Product.objects.order_by('id').values_list('id', flat=True))
+            Product.objects.filter(id__in=hot).update(stock=options['stock'])
+            self.run(hot, options)
+
+    def run(self, hot, options):
+        cart = {pk: 1 for pk in hot}
+        latencies, results = [], {'reserved': 0, 'sold_out': 0, 'lock_retries': 0}
+        lock = threading.Lock()
+
+        def buyer():
+            local_latencies, local = [], dict.fromkeys(results, 0)
+            try:
+                for _ in range(options['attempts']):
+                    started = time.perf_counter()
+                    while True:
+                        try:
+                            reserve(cart)
+                            local['reserved'] += 1
+                        except OutOfStock:
+                            local['sold_out'] += 1
+                        except OperationalError:  # sqlite "database is locked"
+                            local['lock_retries'] += 1
+                            continue
+                        break
+                    local_latencies.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(local_latencies)
+                    for key, value in local.items():
+                        results[key] += value
+
+        threads = [threading.Thread(target=buyer) for _ in range(options['buyers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - started
+
+        latencies.sort()
+        attempts = len(latencies)
+        self.stdout.write(
+            f"{options['buyers']} buyers, {attempts} attempts on {len(hot)} product(s) in {seconds:.2f} s: "
+            f"{attempts / seconds:.1f} attempts/s, p50 {percentile(latencies, 50) * 1000:.2f} ms, "
+            f"p99 {percentile(latencies, 99) * 1000:.2f} ms"
+        )
+        self.stdout.write(
+            f"reserved {results['reserved']}, sold out {results['sold_out']}, lock retries {results['lock_retries']}"
+        )
+
+        # every unit is either still in stock or held by exactly one reservation
+        expected = options['stock'] - results['reserved']
+        stock = dict(Product.objects.filter(id__in=hot).values_list('id', 'stock'))
+        if any(value != expected for value in stock.values()) or Reservation.objects.count() != results['reserved']:
+            raise CommandError(f'stock mismatch: expected {expected} left, got {stock}')
+        self.stdout.write(self.style.SUCCESS(f'no overselling, {expected} unit(s) left per product'))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from shop.benchmarks import benchmark_database, seed_catalog, best_time
+from shop.models import Product
+from shop.serializers import ProductSerializer, ProductFastSerializer, render_json, orjson, PUBLIC_PRODUCT_FIELDS
+
+
+# python manage.py bench_serializers [--sizes 1000 10000 100000] [--repeat 3]
+# compares ProductSerializer + JSONRenderer with the .values() fast path (and orjson if installed)
+# on a throwaway test database, and checks both produce the same bytes
+class Command(BaseCommand):
+    help = 'Benchmark ProductSerializer against ProductFastSerializer on synthetic catalogs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            seeded = 0
+            for size in sorted(options['sizes']):
+                seed_catalog(size - seeded)
+                seeded = size
+                self.run_size(size, options['repeat'])
+
+    def run_size(self, size, repeat):
+        products = Product.objects.order_by('id')
+        fast = ProductFastSerializer()
+
+        def drf():
+            return JSONRenderer().render(ProductSerializer(products, many=True, fields=PUBLIC_PRODUCT_FIELDS).data)
+
+        def fast_path():
+            return render_json(fast.to_representation(fast.values(products)))
+
+        if drf() != fast_path():
+            raise CommandError(f'fast path output differs from ProductSerializer at {size} products')
+
+        drf_seconds = best_time(drf, repeat)
+        fast_seconds = best_time(fast_path, repeat)
+        self.stdout.write(
+            f"{size:>7} products: ProductSerializer {drf_seconds * 1000:9.1f} ms | "
+            f"fast path{' (orjson)' if orjson else ''} {fast_seconds * 1000:9.1f} ms | "
+            f"{drf_seconds / fast_seconds:5.1f}x faster, output identical"
+        )
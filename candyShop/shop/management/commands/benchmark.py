@@ -0,0 +1,223 @@
+import json
+import platform
+import random
+import socket
+import statistics
+import time
+import tracemalloc
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.testcases import LiveServerThread, _StaticFilesHandler
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from shop.benchmarks import benchmark_database, seed_catalog, percentile, run_load, response_cache_disabled
+from shop.models import Product
+from shop.signals import catalog_changed
+
+
+SEARCH_WORDS = ['sour', 'sweet', 'gummy', 'chocolate', 'mint', 'caramel', 'fruit', 'jelly', 'toffee', 'lolly']
+
+# name -> (method, build(rng, ids) returning (path, json body) of a random request, also run under http load)
+ENDPOINTS = {
+    'product_list': ('GET', lambda rng, ids: ('/shop/products/?limit=24', None), True),
+    'product_list_category': ('GET', lambda rng, ids: (f'/shop/products/?limit=24&category=bench-category-{rng.randrange(10)}', None), True),
+    'product_list_full': ('GET', lambda rng, ids: ('/shop/products/', None), False),  # whole catalog in one response
+    'search_product': ('GET', lambda rng, ids: (f'/shop/search_product/?search_product={rng.choice(SEARCH_WORDS)}', None), True),
+    'get_multiple_products': ('POST', lambda rng, ids: ('/shop/get_multiple_products/', {"ids": rng.sample(ids, min(50, len(ids)))}), True),
+}
+
+# django's threaded test server with Nagle's algorithm off on accepted connections. wsgiref writes
+# the headers and the body separately, so on a keep-alive connection the body waited for the
+# client's delayed ACK (~40 ms) and every endpoint measured the same flat latency
+class NoDelayWSGIServer(ThreadedWSGIServer):
+    def get_request(self):
+        sock, address = super().get_request()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, address
+
+
+class BenchmarkServerThread(LiveServerThread):
+    server_class = NoDelayWSGIServer
+
+
+# metric -> direction of a regression ('higher' = bigger is worse)
+COMPARED_METRICS = {'rps': 'lower', 'p50_ms': 'higher', 'p99_ms': 'higher', 'queries': 'higher', 'peak_kib': 'higher'}
+
+
+# python manage.py benchmark [--sizes 1000 10000 100000] [--output baseline.json]
+# python manage.py benchmark --compare baseline.json [--tolerance 0.2]
+#
+# seeds synthetic catalogs on a throwaway test database (sqlite or the configured postgres) and,
+# per catalog size and endpoint, measures:
+#   client: --iterations requests through the django test client, each one a response cache
+#           miss (the code path a change actually affects),
+#           plus sql queries and peak python memory of a single request
+#   http:   --requests requests from --concurrency threads against a live threaded server,
+#           steady state with a warm response cache
+# --compare exits non-zero when a metric got worse than the baseline by more than --tolerance
+# (query counts are compared exactly)
+class Command(BaseCommand):
+    help = 'Benchmark the catalog endpoints on synthetic catalogs and compare against a JSON baseline.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--no-http', action='store_true', help='skip the live server load test')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='write results as JSON to this file (e.g. to use as a baseline)')
+        parser.add_argument('--compare', help='baseline JSON file written by a previous --output')
+        parser.add_argument('--tolerance', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        results = {}
+        hosts = [*settings.ALLOWED_HOSTS, 'testserver', 'localhost']
+        unthrottled = {**settings.SHOP_THROTTLE, 'ENABLED': False}  # measure the endpoints, not the rate limits
+        with benchmark_database(), override_settings(ALLOWED_HOSTS=hosts, SHOP_THROTTLE=unthrottled):
+            seeded = 0
+            for size in sorted(options['sizes']):
+                seed_catalog(size - seeded, seed=options['seed'])
+                seeded = size
+                catalog_changed.send(sender=Product, bulk=True)  # bulk_create sends no signals
+                results[str(size)] = self.run_size(size, options)
+
+        report = {
+            "meta": {
+                "created": timezone.now().isoformat(),
+                "database": connection.vendor,
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "iterations": options['iterations'],
+                "concurrency": options['concurrency'],
+                "requests": options['requests'],
+            },
+            "results": results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f"results written to {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as baseline:
+                regressions = self.compare(json.load(baseline)['results'], results, options['tolerance'])
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["compare"]}')
+            self.stdout.write(self.style.SUCCESS(f"no regressions against {options['compare']}"))
+
+    def run_size(self, size, options):
+        rng = random.Random(options['seed'])
+        ids = list(Product.objects.values_list('id', flat=True))
+        server = None if options['no_http'] else self.start_server()
+
+        results = {}
+        try:
+            for name in options['endpoints']:
+                method, build, under_load = ENDPOINTS[name]
+                results[name] = {"client": self.run_client(method, build, rng, ids, options['iterations'])}
+                if server is not None and under_load:
+                    path, body = build(rng, ids)
+                    results[name]["http"] = run_load(
+                        f'http://localhost:{server.port}{path}', options['concurrency'], options['requests'],
+                        method, json.dumps(body).encode() if body is not None else None,
+                    )
+                self.report(size, name, results[name])
+        finally:
+            if server is not None:
+                server.terminate()
+        return results
+
+    def run_client(self, method, build, rng, ids, iterations):
+        with response_cache_disabled():
+            return self.measure_client(method, build, rng, ids, iterations)
+
+    def measure_client(self, method, build, rng, ids, iterations):
+        client = Client()
+
+        def request():
+            path, body = build(rng, ids)
+            if method == 'GET':
+                return client.get(path)
+            return client.post(path, body, content_type='application/json')
+
+        request()  # warm up (imports, search index, category cache)
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = request()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                raise CommandError(f'{method} {response.request["PATH_INFO"]} returned {response.status_code}')
+        latencies.sort()
+
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            request()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "requests": iterations,
+            "rps": round(iterations / sum(latencies), 1),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "queries": len(queries),
+            "peak_kib": round(peak / 1024, 1),
+        }
+
+    # same setup as LiveServerTestCase, so an in-memory sqlite test database is shared with the server threads
+    @staticmethod
+    def start_server():
+        connections_override = {}
+        for conn in connections.all():
+            if conn.vendor == 'sqlite' and conn.is_in_memory_db():
+                conn.inc_thread_sharing()
+                connections_override[conn.alias] = conn
+        server = BenchmarkServerThread('localhost', _StaticFilesHandler, connections_override=connections_override)
+        server.daemon = True
+        server.start()
+        server.is_ready.wait()
+        if server.error:
+            raise server.error
+        return server
+
+    def report(self, size, name, result):
+        client = result['client']
+        line = (f"{size:>7} {name:<24} client {client['rps']:>8} req/s  p50 {client['p50_ms']:>8} ms  "
+                f"p99 {client['p99_ms']:>8} ms  {client['queries']} queries  {client['peak_kib']} KiB peak")
+        if 'http' in result:
+            http = result['http']
+            line += (f"\n{'':>32}http   {http['rps']:>8} req/s  p50 {http['p50_ms']:>8} ms  "
+                     f"p99 {http['p99_ms']:>8} ms  {http['errors']} errors")
+        self.stdout.write(line)
+
+    def compare(self, baseline, results, tolerance):
+        regressions = []
+        for size, endpoints in results.items():
+            for name, phases in endpoints.items():
+                for phase, metrics in phases.items():
+                    old_metrics = baseline.get(size, {}).get(name, {}).get(phase)
+                    if not old_metrics:
+                        continue
+                    for metric, worse in COMPARED_METRICS.items():
+                        old, new = old_metrics.get(metric), metrics.get(metric)
+                        if old is None or new is None:
+                            continue
+                        allowed = 0 if metric == 'queries' else tolerance
+                        if worse == 'higher':
+                            regressed = new > old * (1 + allowed)
+                        else:
+                            regressed = new < old * (1 - allowed)
+                        if regressed:
+                            regressions.append((size, name, phase, metric))
+                            self.stdout.write(self.style.ERROR(
+                                f"REGRESSION {size} {name} {phase} {metric}: {old} -> {new}"
+                            ))
+        return regressions
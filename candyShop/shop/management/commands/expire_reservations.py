@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from shop.reservations import expire_reservations
+
+
+# python manage.py expire_reservations [--batch-size 500]
+# gives the stock of unpaid, expired checkout reservations back. run it every minute or so
+# (cron / heroku scheduler); safe to run from several workers at once
+class Command(BaseCommand):
+    help = 'Release the stock held by expired, unpaid reservations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        expired = expire_reservations(options['batch_size'])
+        self.stdout.write(f'{expired} reservation(s) expired')
@@ -0,0 +1,24 @@
+import sys
+from django.core.management.base import BaseCommand
+from shop.export import iter_catalog, EXPORT_FORMATS, DEFAULT_CHUNK_SIZE
+
+
+# python manage.py export_catalog [--format ndjson|json] [--output catalog.ndjson]
+class Command(BaseCommand):
+    help = 'Stream the whole product catalog as NDJSON or a JSON array, with flat memory use.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', dest='file_format', choices=list(EXPORT_FORMATS), default='ndjson')
+        parser.add_argument('--output', help='file to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunks = iter_catalog(options['file_format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from shop.bulk import import_products, detect_format, ImportFormatError, DEFAULT_BATCH_SIZE
+
+
+# python manage.py import_products catalog.jsonl [--format csv] [--batch-size 500]
+class Command(BaseCommand):
+    help = 'Bulk import/upsert products (keyed on price_id) from a JSON Lines or CSV file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', help="'jsonl' or 'csv' (default: from file extension)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            file_format = detect_format(options['file_format'], options['path'])
+        except ImportFormatError as e:
+            raise CommandError(str(e))
+
+        with open(options['path'], 'rb') as stream:
+            report = import_products(stream, file_format, options['batch_size'])
+
+        for error in report['errors']:
+            self.stderr.write(f"row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(
+            f"{report['rows']} rows: {report['created']} created, {report['updated']} updated, "
+            f"{report['failed']} failed in {report['seconds']}s ({report['rows_per_second']} rows/s)"
+        )
@@ -0,0 +1,39 @@
+import json
+from django.core.management.base import BaseCommand
+from shop.benchmarks import run_load
+
+
+# python manage.py loadtest --url URL [--url URL ...] [--concurrency 200] [--requests 20000]
+#
+# drives already running servers (start them with SHOP_THROTTLE_ENABLED=False, otherwise the
+# rate limits answer most requests with 429), e.g. to compare the WSGI views with the async ones:
+#   gunicorn candyShop.wsgi -w 4 -b 127.0.0.1:8000
+#   uvicorn candyShop.asgi:application --workers 4 --port 8001
+#   python manage.py loadtest --concurrency 200 \
+#       --url http://127.0.0.1:8000/shop/products/?limit=24 \
+#       --url http://127.0.0.1:8001/shop/async/products/?limit=24
+class Command(BaseCommand):
+    help = 'Concurrent HTTP load test reporting requests/sec and p50/p99 latency per URL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', required=True)
+        parser.add_argument('--concurrency', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--method', default='GET')
+        parser.add_argument('--body', help='JSON request body, e.g. \'{"ids": [1, 2, 3]}\'')
+        parser.add_argument('--output', help='also write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        body = options['body'].encode() if options['body'] else None
+        results = []
+        for url in options['url']:
+            result = run_load(url, options['concurrency'], options['requests'], options['method'], body)
+            results.append(result)
+            self.stdout.write(
+                f"{url}\n  {result['requests']} requests, {result['errors']} errors, {result['rps']} req/s, "
+                f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms (concurrency {result['concurrency']})"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
@@ -0,0 +1,316 @@
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import JsonResponse
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from .cache import get_cache, is_shared_cache
+from .compression import negotiate_encoding, compress, COMPRESSIBLE_TYPES
+from .routers import read_from_replica, pinned_to_primary
+from .timing import RequestTimings, current_timings, render_timer
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+# routes reads of safe requests to the replica (see routers.py). after a successful write,
+# the same client (JWT or session) is pinned to the primary for REPLICA_PIN_SECONDS, so an
+# admin always reads their own writes even while the replica lags behind. pinned requests also
+# bypass the response caches (see cache.py), which other clients may have filled from the replica.
+# the pins are kept in the REPLICA_PIN_CACHE alias, which must be shared by all workers (the next
+# request may land on another one). disabled (no overhead at all) when no replica is configured
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if 'replica' not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.pins = caches[getattr(settings, 'REPLICA_PIN_CACHE', 'default')]
+        if not is_shared_cache(self.pins):
+            raise ImproperlyConfigured(
+                'A read replica needs a cache shared by all workers for read-your-writes pins, '
+                'set CACHE_URL (e.g. redis://...) or REPLICA_PIN_CACHE.'
+            )
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        replica, pinned = self.route(request)
+        tokens = read_from_replica.set(replica), pinned_to_primary.set(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_from_replica.reset(tokens[0])
+            pinned_to_primary.reset(tokens[1])
+        self.pin_after_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        replica, pinned = self.route(request)
+        tokens = read_from_replica.set(replica), pinned_to_primary.set(pinned)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_from_replica.reset(tokens[0])
+            pinned_to_primary.reset(tokens[1])
+        self.pin_after_write(request, response)
+        return response
+
+    # cache key for whoever sent the request (bearer token or session), None for anonymous
+    @staticmethod
+    def client_key(request):
+        identity = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        if not identity:
+            return None
+        return 'shop:pin-primary:' + hashlib.sha256(identity.encode()).hexdigest()
+
+    # (read from the replica, client is pinned to the primary)
+    def route(self, request):
+        if request.method not in SAFE_METHODS:
+            return False, False
+        key = self.client_key(request)
+        pinned = key is not None and self.pins.get(key) is not None
+        return not pinned, pinned
+
+    def pin_after_write(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        key = self.client_key(request)
+        if key is not None:
+            self.pins.set(key, True, timeout=self.pin_seconds)
+
+
+# totals per view since process start (what /shop/metrics/ reports)
+class RequestMetrics:
+    FIELDS = ('requests', 'db_queries', 'db_seconds', 'render_seconds', 'request_seconds', 'response_bytes')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+
+    def record(self, view, **values):
+        with self._lock:
+            totals = self._views[view]
+            totals['requests'] += 1
+            for name, value in values.items():
+                totals[name] += value
+
+    # prometheus text exposition format
+    def render(self):
+        with self._lock:
+            views = {view: dict(totals) for view, totals in self._views.items()}
+        lines = []
+        for field in self.FIELDS:
+            metric = f'shop_{field}_total'
+            lines.append(f'# TYPE {metric} counter')
+            for view, totals in sorted(views.items()):
+                lines.append(f'{metric}{{view="{view}"}} {totals[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+# per request: sql query count and time, render time (serializers + JSON encoding, also when
+# @cache_response renders inside the view, see timing.py) and response size.
+# adds a Server-Timing header (visible in browser devtools) and feeds request_metrics.
+# only active with SHOP_INSTRUMENTATION=True, otherwise removed from the stack at startup
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SHOP_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = self.start(request)
+        token = current_timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.query_wrapper))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = self.start(request)
+        token = current_timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.query_wrapper))
+                response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    def start(self, request):
+        timings = RequestTimings()
+        request._shop_timings = timings
+        return timings
+
+    # DRF responses are rendered lazily, render here so the time can be attributed to rendering
+    def process_template_response(self, request, response):
+        if getattr(request, '_shop_timings', None) is not None and not response.is_rendered:
+            with render_timer():
+                response.render()
+        return response
+
+    def finish(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+        response_bytes = 0 if response.streaming else len(response.content)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+
+        request_metrics.record(
+            view,
+            db_queries=timings.queries,
+            db_seconds=timings.db_seconds,
+            render_seconds=timings.render_seconds,
+            request_seconds=total,
+            response_bytes=response_bytes,
+        )
+        app_seconds = max(0.0, total - timings.db_seconds - timings.render_seconds)
+        response['Server-Timing'] = (
+            f'db;dur={timings.db_seconds * 1000:.2f};desc="{timings.queries} queries", '
+            f'render;dur={timings.render_seconds * 1000:.2f}, '
+            f'app;dur={app_seconds * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
+
+
+# gzip (or brotli, when installed) for JSON/text responses the client accepts compressed.
+# bodies under SHOP_COMPRESS_MIN_BYTES are sent as is (not worth the cpu and headers).
+# responses from @cache_response carry their cache key, their compressed body is stored next
+# to the cached JSON and reused until the catalog changes, so a hot catalog page is compressed
+# once per catalog version instead of on every request. streaming responses are left alone
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SHOP_COMPRESSION', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.min_bytes = getattr(settings, 'SHOP_COMPRESS_MIN_BYTES', 1024)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if len(response.content) < self.min_bytes:
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        body = self.compressed_body(response, encoding)
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag  # same as django's GZipMiddleware: the bytes differ from the identity body
+        return response
+
+    def compressed_body(self, response, encoding):
+        key = getattr(response, 'shop_cache_key', None)
+        if key is None:
+            return compress(response.content, encoding)
+
+        cache = get_cache()
+        compressed_key = f'{key}:{encoding}'
+        body = cache.get(compressed_key)
+        if body is None:
+            body = compress(response.content, encoding)
+            cache.set(compressed_key, body, getattr(response, 'shop_cache_timeout', None))
+        return body
+
+
+# load shedding: at most SHOP_MAX_CONCURRENT_REQUESTS requests in flight per process, anything
+# beyond that gets an immediate 503 with Retry-After instead of queueing up on the database.
+# disabled when the limit is 0 (default)
+class LoadSheddingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.limit = getattr(settings, 'SHOP_MAX_CONCURRENT_REQUESTS', 0)
+        if not self.limit:
+            raise MiddlewareNotUsed
+        self.retry_after = getattr(settings, 'SHOP_SHED_RETRY_AFTER', 1)
+        self.get_response = get_response
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enter():
+            return self.busy_response()
+        try:
+            return self.get_response(request)
+        finally:
+            self.leave()
+
+    async def __acall__(self, request):
+        if not self.enter():
+            return self.busy_response()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.leave()
+
+    def enter(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def busy_response(self):
+        response = JsonResponse({"error": "Server is busy, please retry shortly."}, status=503)
+        response['Retry-After'] = str(self.retry_after)
+        return response
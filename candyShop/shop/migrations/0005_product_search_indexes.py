@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+# postgres only: pg_trgm index for partial name matches and a weighted tsvector index
+# for full text search (see shop/search.py, the vector expression has to match SEARCH_VECTOR_SQL).
+# other databases (sqlite in tests) use the in-memory fallback index instead
+CREATE_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS shop_product_name_trgm ON shop_product USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS shop_product_search_vector ON shop_product USING gin (("
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')))",
+]
+
+DROP_SQL = [
+    "DROP INDEX IF EXISTS shop_product_search_vector",
+    "DROP INDEX IF EXISTS shop_product_name_trgm",
+]
+
+
+def run_on_postgres(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_product_price_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(CREATE_SQL), run_on_postgres(DROP_SQL)),
+    ]
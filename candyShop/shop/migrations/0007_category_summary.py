@@ -0,0 +1,48 @@
+# Generated by Django 5.1 on 2026-10-18 09:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min, Max
+
+
+# fill the summary table for the existing catalog, afterwards signals keep it up to date
+def backfill_summaries(apps, schema_editor):
+    Category = apps.get_model('shop', 'Category')
+    CategorySummary = apps.get_model('shop', 'CategorySummary')
+    stats = Category.objects.annotate(
+        product_count=Count('products'),
+        min_price=Min('products__price'),
+        max_price=Max('products__price'),
+        latest_updated_at=Max('products__updated_at'),
+    ).values('pk', 'product_count', 'min_price', 'max_price', 'latest_updated_at')
+    CategorySummary.objects.bulk_create([
+        CategorySummary(
+            category_id=row['pk'],
+            product_count=row['product_count'],
+            min_price=row['min_price'],
+            max_price=row['max_price'],
+            latest_updated_at=row['latest_updated_at'],
+        )
+        for row in stats
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_product_storefront_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySummary',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='shop.category')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('latest_updated_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 
 # category model -- (Related to Product model) --
@@ -7,6 +8,10 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+# products that have a stripe price id (condition of the unique price_id index, repeat it in
+# price_id lookups so every database can use that partial index)
+HAS_PRICE_ID = models.Q(price_id__isnull=False) & ~models.Q(price_id='')
+
 # main product model
 class Product(models.Model):
     name = models.CharField(max_length=100) # product name
@@ -17,6 +22,87 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products', default=1) # category model relation (id). Defaults to 1 for previous data entries, or if new product created but no value for category provided
     created_at = models.DateTimeField(auto_now_add=True)  # timestamp for product creation
     updated_at = models.DateTimeField(auto_now=True)  # timestamp for the last update
+    stock = models.PositiveIntegerField(default=0)  # units available, decremented atomically by reservations (see reservations.py)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),  # newest-first listing / cursor pages
+            models.Index(fields=['category', 'created_at', 'id'], name='product_category_created_idx'),  # same, per category
+            models.Index(fields=['price', 'id'], name='product_price_idx'),  # ?sort=price / -price pages, price ranges
+            models.Index(fields=['category', 'price', 'id'], name='product_category_price_idx'),  # same, per category
+        ]
+        constraints = [
+            # stripe price ids are unique when set (also indexes the lookups by price_id)
+            models.UniqueConstraint(
+                fields=['price_id'],
+                condition=HAS_PRICE_ID,
+                name='product_unique_price_id',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    # remember the category the row was loaded with: when a save moves the product, signals.py
+    # refreshes the summaries of both categories without querying for the old one
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        return instance
+
+
+# precomputed per-category numbers for the storefront navigation (categories endpoint),
+# kept up to date by signals.py, see summary.py
+class CategorySummary(models.Model):
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    product_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)  # null while the category is empty
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True)
+    latest_updated_at = models.DateTimeField(null=True)  # newest Product.updated_at in the category
+
+    def __str__(self):
+        return f'{self.category_id}: {self.product_count} products'
+
+
+# catalog version the response caches are keyed on (see cache.py), a single row. it lives in the
+# database so every worker process sees a write made by any other one; bumped after each write
+class CatalogVersion(models.Model):
+    version = models.BigIntegerField()
+    changed_at = models.DateTimeField()  # time of the last catalog write
+
+    def __str__(self):
+        return str(self.version)
+
+
+# checkout hold on stock for a cart until it is paid or expires (expire_reservations command)
+class Reservation(models.Model):
+    PENDING = 'pending'
+    PAID = 'paid'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (PAID, 'Paid'), (EXPIRED, 'Expired')]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # not guessable, handed to the client
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()  # stock goes back after this unless paid (confirm_payment)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_expiry_idx'),  # expiry batches
+        ]
+
+    def __str__(self):
+        return f'{self.id} ({self.status})'
+
+
+# one cart line, with the price and stripe price id as they were when the stock was reserved
+class ReservationItem(models.Model):
+    reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservation_items')
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)  # price snapshot
+    price_id = models.CharField(max_length=100, blank=True, null=True)  # stripe price id snapshot
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return f'{self.quantity} x {self.product_id}'
@@ -0,0 +1,109 @@
+import base64
+import json
+from decimal import Decimal
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# raised for malformed query parameters (views turn it into 400)
+class InvalidParameter(ValueError):
+    pass
+
+
+# keyset (cursor) pagination over (created_at, id), newest first.
+# each page is one indexed range scan, no OFFSET and no COUNT(*)
+class CursorPaginator:
+    DEFAULT_LIMIT = 24
+    MAX_LIMIT = 100
+    key_column = 'created_at'
+    descending = True
+    ordering = ('-created_at', '-id')
+    cursor_columns = ('id', 'created_at')  # columns a .values() queryset needs for encode_cursor
+
+    def __init__(self, request):
+        self.limit = self.parse_limit(request.GET.get('limit'))
+        self.position = self.decode_cursor(request.GET.get('cursor'))
+
+    def parse_limit(self, raw):
+        if raw in (None, ''):
+            return self.DEFAULT_LIMIT
+        try:
+            limit = int(raw)
+        except ValueError:
+            raise InvalidParameter("'limit' must be an integer.")
+        if limit < 1:
+            raise InvalidParameter("'limit' must be positive.")
+        return min(limit, self.MAX_LIMIT)
+
+    # cursor is an opaque urlsafe base64 of [key, id] of the last row on the previous page
+    def decode_cursor(self, raw):
+        if not raw:
+            return None
+        try:
+            padded = raw + '=' * (-len(raw) % 4)
+            key, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            key = self.parse_key(key)
+            pk = int(pk)
+        except (ValueError, TypeError, ArithmeticError):
+            raise InvalidParameter("Invalid cursor.")
+        if key is None:
+            raise InvalidParameter("Invalid cursor.")
+        return key, pk
+
+    def parse_key(self, raw):
+        return parse_datetime(raw)
+
+    def format_key(self, value):
+        return value.isoformat()
+
+    # works for model instances and .values() rows
+    def encode_cursor(self, row):
+        if isinstance(row, dict):
+            key, pk = row[self.key_column], row['id']
+        else:
+            key, pk = getattr(row, self.key_column), row.pk
+        raw = json.dumps([self.format_key(key), pk])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    # returns (page_of_products, next_cursor or None), .values() querysets need the cursor_columns
+    def paginate(self, queryset):
+        return self.finish(list(self.page_queryset(queryset)))
+
+    async def apaginate(self, queryset):
+        return self.finish([row async for row in self.page_queryset(queryset)])
+
+    # rows after the cursor, plus one extra row to know if there is a next page
+    def page_queryset(self, queryset):
+        queryset = queryset.order_by(*self.ordering)
+        if self.position:
+            key, pk = self.position
+            lookup = 'lt' if self.descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.key_column}__{lookup}': key}) | Q(**{self.key_column: key, f'id__{lookup}': pk})
+            )
+        return queryset[:self.limit + 1]
+
+    def finish(self, page):
+        next_cursor = None
+        if len(page) > self.limit:
+            page = page[:self.limit]
+            next_cursor = self.encode_cursor(page[-1])
+        return page, next_cursor
+
+
+# same over (price, id), cheapest first or (descending) most expensive first
+class PriceCursorPaginator(CursorPaginator):
+    key_column = 'price'
+    cursor_columns = ('id', 'price')
+
+    def __init__(self, request, descending=False):
+        self.descending = descending
+        self.ordering = ('-price', '-id') if descending else ('price', 'id')
+        super().__init__(request)
+
+    def parse_key(self, raw):
+        price = Decimal(raw)  # InvalidOperation for garbage
+        return price if price.is_finite() else None
+
+    def format_key(self, value):
+        return str(value)
@@ -0,0 +1,139 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Product, Reservation, ReservationItem
+from .pagination import InvalidParameter
+
+
+MAX_CART_LINES = 100
+MAX_QUANTITY = 100  # per product and reservation
+
+
+# raised when some products don't have enough stock, nothing is reserved then.
+# unavailable: [{"id", "requested", "available"}], available is None for unknown products
+class OutOfStock(Exception):
+    def __init__(self, unavailable):
+        super().__init__('Insufficient stock.')
+        self.unavailable = unavailable
+
+
+# '{"items": [{"id": 1, "quantity": 2}, ...]}' -> {product_id: quantity}, repeated ids are added up
+def parse_cart(data):
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise InvalidParameter("'items' must be a non-empty list.")
+    if len(items) > MAX_CART_LINES:
+        raise InvalidParameter(f"Too many items. Maximum allowed is {MAX_CART_LINES}.")
+
+    cart = Counter()
+    for item in items:
+        try:
+            pk, quantity = int(item['id']), int(item.get('quantity', 1))
+        except (TypeError, ValueError, KeyError):
+            raise InvalidParameter("Every item needs an integer 'id' and 'quantity'.")
+        if quantity < 1:
+            raise InvalidParameter("'quantity' must be positive.")
+        cart[pk] += quantity
+    if any(quantity > MAX_QUANTITY for quantity in cart.values()):
+        raise InvalidParameter(f"'quantity' must not exceed {MAX_QUANTITY} per product.")
+    return dict(cart)
+
+
+# reserves the whole cart or nothing (OutOfStock rolls back the lines already taken).
+# each line is one conditional
+#   UPDATE shop_product SET stock = stock - n WHERE id = ? AND stock >= n
+# so stock can't go negative however many buyers race for the last units. the row lock is held
+# until commit and rows are always locked in id order, so two carts can't deadlock each other.
+# stock isn't part of the cached catalog responses, so a reservation leaves the catalog version
+# (and updated_at) alone and doesn't empty the response caches during a sale.
+# returns (reservation, [(ReservationItem, product name), ...])
+def reserve(cart, ttl=None):
+    ttl = ttl or timedelta(minutes=getattr(settings, 'SHOP_RESERVATION_MINUTES', 15))
+    now = timezone.now()
+
+    with transaction.atomic():
+        short = [
+            pk for pk in sorted(cart)
+            if not Product.objects.filter(pk=pk, stock__gte=cart[pk]).update(stock=F('stock') - cart[pk])
+        ]
+        if short:
+            available = dict(Product.objects.filter(pk__in=short).values_list('id', 'stock'))
+            raise OutOfStock([{"id": pk, "requested": cart[pk], "available": available.get(pk)} for pk in short])
+
+        reservation = Reservation.objects.create(expires_at=now + ttl)
+        snapshot = list(Product.objects.filter(pk__in=cart).values('id', 'name', 'price', 'price_id'))
+        items = [
+            ReservationItem(
+                reservation=reservation, product_id=row['id'], quantity=cart[row['id']],
+                unit_price=row['price'], price_id=row['price_id'],
+            )
+            for row in snapshot
+        ]
+        ReservationItem.objects.bulk_create(items)
+
+    names = {row['id']: row['name'] for row in snapshot}
+    return reservation, [(item, names[item.product_id]) for item in sorted(items, key=lambda item: item.product_id)]
+
+
+# "stock_delta" of an update/import -> int, units to add (negative = remove)
+def parse_stock_delta(value):
+    if isinstance(value, bool):
+        raise InvalidParameter("'stock_delta' must be an integer.")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidParameter("'stock_delta' must be an integer.")
+
+
+# restocking / corrections for existing products. one relative UPDATE (stock = stock + delta), so
+# units held by reservations made meanwhile aren't overwritten the way an absolute write would.
+# a product without enough stock for a negative delta is left alone; returns the number adjusted.
+# products migrated from before stock existed start at 0: seed them with a bulk update
+# ({"category": "...", "changes": {"stock_delta": 50}}) or an import with a stock_delta column
+def adjust_stock(products, delta):
+    if delta < 0:
+        products = products.filter(stock__gte=-delta)
+    return products.update(stock=F('stock') + delta)
+
+
+# marks a reservation paid once the payment went through (payment webhook / order backend).
+# one conditional UPDATE ... WHERE status = 'pending' AND expires_at > now, so it can't race
+# expire_reservations: whichever runs first wins and the other one doesn't touch the row.
+# returns True when the reservation is now paid, False when it's unknown, expired or already paid
+def confirm_payment(reservation_id, now=None):
+    now = now or timezone.now()
+    return bool(
+        Reservation.objects.filter(pk=reservation_id, status=Reservation.PENDING, expires_at__gt=now)
+        .update(status=Reservation.PAID)
+    )
+
+
+# returns the stock of pending reservations past their expiry, `batch_size` reservations per
+# transaction. skip_locked lets several workers (or a worker and a payment webhook marking a
+# reservation paid) run at once without waiting on each other. returns the number expired
+def expire_reservations(batch_size=500, now=None):
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Reservation.objects.select_for_update(skip_locked=True)
+                .filter(status=Reservation.PENDING, expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+
+            quantities = (
+                ReservationItem.objects.filter(reservation_id__in=batch)
+                .values('product_id').annotate(quantity=Sum('quantity')).order_by('product_id')  # same lock order as reserve()
+            )
+            for row in quantities:
+                Product.objects.filter(pk=row['product_id']).update(stock=F('stock') + row['quantity'])
+            Reservation.objects.filter(id__in=batch).update(status=Reservation.EXPIRED)
+        expired += len(batch)
+    return expired
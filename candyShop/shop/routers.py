@@ -0,0 +1,28 @@
+from contextvars import ContextVar
+from django.conf import settings
+
+
+# set per request by ReplicaRoutingMiddleware: True for safe (GET/HEAD) requests that aren't
+# pinned to the primary. management commands, migrations and writes always use 'default'
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+# True for requests of a client pinned to the primary after a write. the response caches may still
+# hold entries built from replica reads, so these requests bypass them (see cache.py)
+pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+# sends reads to the 'replica' alias (when configured) while a request allows it, writes to 'default'
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if read_from_replica.get() and 'replica' in settings.DATABASES:
+            return 'replica'
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replica holds the same data as primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'  # the replica gets schema changes through replication
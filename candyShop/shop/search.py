@@ -0,0 +1,160 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.db import connection
+from .models import Product
+from .pagination import InvalidParameter
+from .cache import get_cache
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 100
+SEARCH_PARAMS = ('search_product', 'limit', 'offset')  # query parameters of the search views
+
+
+# "?limit=&offset=" for search results
+def parse_limit_offset(request):
+    try:
+        limit = int(request.GET.get('limit') or DEFAULT_LIMIT)
+        offset = int(request.GET.get('offset') or 0)
+    except ValueError:
+        raise InvalidParameter("'limit' and 'offset' must be integers.")
+    if limit < 1 or offset < 0:
+        raise InvalidParameter("'limit' must be positive and 'offset' non-negative.")
+    return min(limit, MAX_LIMIT), offset
+
+
+# -- postgres: tsvector + trigram indexes (created in migration 0005_product_search_indexes) --
+# the vector expression must stay identical to the indexed one, otherwise the planner won't use the index
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(p.name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(p.description, '')), 'B')"
+)
+
+POSTGRES_SEARCH_SQL = f"""
+    SELECT p.*
+    FROM shop_product p, websearch_to_tsquery('english', %s) query
+    WHERE ({SEARCH_VECTOR_SQL}) @@ query OR p.name ILIKE %s
+    ORDER BY ts_rank({SEARCH_VECTOR_SQL}, query) DESC, similarity(p.name, %s) DESC, p.id
+    LIMIT %s OFFSET %s
+"""
+
+
+class PostgresSearchBackend:
+    # full-text matches on name/description ranked first, then partial name matches (trigram index
+    # keeps ILIKE '%q%' off a sequential scan). one query per request
+    def search(self, query, limit, offset):
+        return list(self._raw(query, limit, offset))
+
+    async def asearch(self, query, limit, offset):
+        return [product async for product in self._raw(query, limit, offset)]
+
+    def _raw(self, query, limit, offset):
+        escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')  # literal LIKE
+        return Product.objects.raw(POSTGRES_SEARCH_SQL, [query, f'%{escaped}%', query, limit, offset])
+
+
+# -- everything else (sqlite in tests/dev): pure python inverted index --
+TOKEN_RE = re.compile(r'\w+')
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+SUBSTRING_WEIGHT = 1  # plain "name contains query" match, the old icontains behaviour
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+class InMemorySearchIndex:
+    # term -> {product_id: weight}, plus lowercase names for substring matches.
+    # built lazily and rebuilt when the catalog version changes (any product/category write)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._postings = {}
+        self._terms = []  # sorted, for prefix lookups with bisect
+        self._names = {}
+
+    def _ensure_fresh(self):
+        version = get_cache().get_version()
+        if self._version == version:
+            return
+        with self._lock:
+            if self._version == version:
+                return
+            postings = defaultdict(dict)
+            names = {}
+            for pk, name, description in Product.objects.values_list('id', 'name', 'description').iterator():
+                names[pk] = (name or '').lower()
+                for term in tokenize(description):
+                    postings[term][pk] = max(postings[term].get(pk, 0), DESCRIPTION_WEIGHT)
+                for term in tokenize(name):
+                    postings[term][pk] = NAME_WEIGHT
+            self._postings = dict(postings)
+            self._terms = sorted(postings)
+            self._names = names
+            self._version = version
+
+    # ids of products with a term starting with prefix -> best weight
+    def _prefix_matches(self, prefix):
+        matches = {}
+        start = bisect.bisect_left(self._terms, prefix)
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            for pk, weight in self._postings[term].items():
+                matches[pk] = max(matches.get(pk, 0), weight)
+        return matches
+
+    # ranked product ids; every query token has to match (as a word prefix)
+    def search_ids(self, query):
+        self._ensure_fresh()
+        scores = None
+        for token in tokenize(query):
+            matches = self._prefix_matches(token)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {pk: scores[pk] + weight for pk, weight in matches.items() if pk in scores}
+        scores = scores or {}
+
+        needle = query.lower()
+        for pk, name in self._names.items():
+            if needle in name:
+                scores[pk] = scores.get(pk, 0) + SUBSTRING_WEIGHT
+
+        return sorted(scores, key=lambda pk: (-scores[pk], pk))
+
+
+class InMemorySearchBackend:
+    def __init__(self):
+        self.index = InMemorySearchIndex()
+
+    def search(self, query, limit, offset):
+        ids = self.index.search_ids(query)[offset:offset + limit]
+        products = Product.objects.in_bulk(ids)  # single query for the page
+        return [products[pk] for pk in ids if pk in products]
+
+    async def asearch(self, query, limit, offset):
+        return await sync_to_async(self.search)(query, limit, offset)  # index (re)build is sync
+
+
+_backends = {}
+
+
+def get_search_backend():
+    vendor = connection.vendor
+    if vendor not in _backends:
+        _backends[vendor] = PostgresSearchBackend() if vendor == 'postgresql' else InMemorySearchBackend()
+    return _backends[vendor]
+
+
+# ranked page of products matching query
+def search_products(query, limit=DEFAULT_LIMIT, offset=0):
+    return get_search_backend().search(query, limit, offset)
+
+
+async def asearch_products(query, limit=DEFAULT_LIMIT, offset=0):
+    return await get_search_backend().asearch(query, limit, offset)
@@ -1,12 +1,191 @@
+import decimal
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Product, Category
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from .models import Product, Category, CategorySummary
+from .pagination import InvalidParameter
+from .cache import category_cache
+from .timing import render_timer
 
-class ProductSerializer(serializers.ModelSerializer):
+try:
+    import orjson  # optional, faster JSON encoding for the fast path
+except ImportError:
+    orjson = None
+
+
+# output of a (read) serializer counts as render time in the request timings (see timing.py)
+class RenderTimedMixin:
+    def to_representation(self, instance):
+        with render_timer():
+            return super().to_representation(instance)
+
+
+class ProductSerializer(RenderTimedMixin, serializers.ModelSerializer):
     class Meta:
         model = Product  #model to ser
         fields = '__all__'
 
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)  # optional projection, e.g. ['id', 'name', 'price']
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)  # drop fields the client didn't ask for
+
+    # stock is set absolutely only when a product is created. afterwards reservations move it, so
+    # an absolute write would clobber units held meanwhile; changes go through stock_delta
+    def validate_stock(self, value):
+        if self.instance is not None:
+            raise serializers.ValidationError("Stock of an existing product is changed with stock_delta (units to add, negative to remove).")
+        return value
+
+    # save only the fields that were sent, so an admin edit doesn't write back a stale
+    # stock value over reservations made since the product was loaded
+    def update(self, instance, validated_data):
+        for field_name, value in validated_data.items():
+            setattr(instance, field_name, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+# fields of the public catalog responses: all but stock, which changes with every checkout and
+# would outdate the cached catalog bodies each time. live stock comes from the stock endpoint
+PUBLIC_PRODUCT_FIELDS = [name for name in ProductSerializer().fields if name != 'stock']
+
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name']  # Specify the fields to be included in the serialized data (use __all__ if neccessary)
+
+
+# one entry of the categories endpoint, straight from the precomputed summary table
+class CategorySummarySerializer(RenderTimedMixin, serializers.ModelSerializer):
+    id = serializers.IntegerField(source='category_id')
+    name = serializers.CharField(source='category.name')
+
+    class Meta:
+        model = CategorySummary
+        fields = ['id', 'name', 'product_count', 'min_price', 'max_price', 'latest_updated_at']
+
+
+# parse "?fields=name,price" into a list of product field names (None means all fields)
+def parse_product_fields(raw):
+    if not raw:
+        return None
+
+    allowed = PUBLIC_PRODUCT_FIELDS
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise InvalidParameter(f"Unknown field(s): {', '.join(unknown)}.")
+
+    if 'id' not in fields:
+        fields.insert(0, 'id')  # id is always returned so the client can link to the product
+    return [name for name in allowed if name in fields]  # keep the serializer's field order
+
+
+# category FK checked against the cached category ids instead of one SELECT per row
+class CachedCategoryField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if not category_cache.has_id(pk):
+            self.fail('does_not_exist', pk_value=data)
+        return Category(pk=pk)  # only the pk is needed to save the product
+
+
+# row serializer for bulk imports (same fields/validation as ProductSerializer)
+class ProductImportSerializer(ProductSerializer):
+    category = CachedCategoryField(queryset=Category.objects.all(), required=False)
+    stock_delta = serializers.IntegerField(required=False, write_only=True)  # units to add, initial stock of new rows
+
+    class Meta(ProductSerializer.Meta):
+        extra_kwargs = {'price_id': {'validators': []}}  # existing price_id means "update", not an error (and no query per row)
+
+    # an absolute stock column would overwrite units held by reservations on updated rows, so imports
+    # take the relative stock_delta for new and existing rows alike
+    def validate_stock(self, value):
+        raise serializers.ValidationError("Stock can't be imported, use stock_delta (units to add, negative to remove).")
+
+
+# validates a batch of rows but keeps the valid ones instead of rejecting the whole batch.
+# validated_data is [(row_index, attrs)], per-row errors end up in row_errors {row_index: errors}
+class ProductImportListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        self.row_errors = {}
+        valid = []
+        for index, item in enumerate(data):
+            try:
+                valid.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                self.row_errors[index] = exc.detail
+        return valid
+
+
+# read-only fast path for product lists: rows come from .values() and are formatted directly,
+# skipping model instances and DRF's per-field get_attribute/to_representation calls.
+# output is identical to ProductSerializer (same fields, order and formatting), field list is taken
+# from ProductSerializer so both stay in sync when the model changes (PUBLIC_PRODUCT_FIELDS by default).
+#   fast = ProductFastSerializer(fields)
+#   data = fast.to_representation(fast.values(queryset))
+class ProductFastSerializer:
+    def __init__(self, fields=None):
+        serializer_fields = ProductSerializer(fields=fields or PUBLIC_PRODUCT_FIELDS).fields
+        self.columns = [field.source for field in serializer_fields.values()]  # FK source 'category' -> category_id
+        self.items = [(name, field.source, self._formatter_factory(field)) for name, field in serializer_fields.items()]
+
+    # returns make(tz) -> formatter for a non-None db value (None when the value is already
+    # what DRF would output). the timezone is resolved once per call, not once per value
+    @staticmethod
+    def _formatter_factory(field):
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return lambda tz: None  # .values() already gives the pk
+        if isinstance(field, (serializers.IntegerField, serializers.CharField)):  # CharField covers URLField
+            return lambda tz: None
+        if (isinstance(field, serializers.DecimalField) and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+                and not field.localize and not field.normalize_output and field.decimal_places is not None):
+            exponent = decimal.Decimal('.1') ** field.decimal_places
+            context = decimal.getcontext().copy()
+            if field.max_digits is not None:
+                context.prec = field.max_digits
+            return lambda tz: lambda value: '{:f}'.format(value.quantize(exponent, rounding=field.rounding, context=context))
+        if isinstance(field, serializers.DateTimeField) and getattr(field, 'format', api_settings.DATETIME_FORMAT) == 'iso-8601':
+            def make(tz):
+                def format_datetime(value):
+                    if tz is None or value.tzinfo is None:
+                        return field.to_representation(value)
+                    value = value.astimezone(tz).isoformat()
+                    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+                return format_datetime
+            return make
+        return lambda tz: field.to_representation  # anything else: let DRF format it
+
+    # .values() queryset with the columns needed (plus `extra`, e.g. cursor columns)
+    def values(self, queryset, extra=()):
+        return queryset.values(*dict.fromkeys([*self.columns, *extra]))
+
+    # raw .values() rows -> list of dicts, same as ProductSerializer(many=True).data
+    def to_representation(self, rows):
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        items = [(name, source, make(tz)) for name, source, make in self.items]
+        with render_timer():
+            return [
+                {name: row[source] if formatter is None or row[source] is None else formatter(row[source])
+                 for name, source, formatter in items}
+                for row in rows
+            ]
+
+
+# JSON bytes for fast path output (only str/int/None values), identical to JSONRenderer's.
+# uses orjson when installed
+def render_json(data):
+    with render_timer():
+        if orjson is None:
+            return JSONRenderer().render(data)
+        # JSONRenderer escapes U+2028/U+2029 for javascript compatibility, orjson doesn't
+        return orjson.dumps(data).replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
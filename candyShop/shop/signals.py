@@ -0,0 +1,131 @@
+import weakref
+from django.db.models.signals import post_save, post_delete
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import receiver, Signal
+from .models import Category, Product
+from .cache import category_cache, bump_catalog_version
+from .autocomplete import autocomplete_index
+from .summary import refresh_category_summaries
+from .authentication import token_cache
+
+
+# sent after any write to the catalog. model saves/deletes send it automatically (below),
+# code doing set-based writes (QuerySet.update(), bulk_create()...) must send it itself with bulk=True
+catalog_changed = Signal()
+
+
+# drop cached category name -> id map whenever a category changes (add_category, admin, shell...)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, **kwargs):
+    category_cache.invalidate()
+
+
+# work collected during a transaction and done once after it commits: the summaries of the touched
+# categories (None = all) first, then the catalog version bump, so no read can cache old summaries
+# under the new version. QuerySet.delete() sends post_delete once per row, deleting 300 products
+# still refreshes their categories with one grouped query and bumps the version once
+class AfterCommit:
+    def __init__(self, connection):
+        self.connection = connection
+        self.category_ids = set()
+        self.bump_version = False
+
+    def __call__(self):
+        pending = getattr(self.connection, 'shop_after_commit', None)
+        if pending is not None and pending() is self:
+            self.connection.shop_after_commit = None  # done, the next transaction starts a new one
+        if self.category_ids is None or self.category_ids:
+            refresh_category_summaries(self.category_ids)
+        if self.bump_version:
+            bump_catalog_version()
+
+
+# adds to the AfterCommit waiting for the current transaction (registers one if there is none yet).
+# the pending callback is kept per connection and registered once with transaction.on_commit; it
+# forgets itself when it runs. the connection only holds a weak reference: when the transaction
+# (or the savepoint it was registered in) rolls back, django drops the callback, the reference
+# dies and the next write registers a new one. outside a transaction the work runs right away
+def after_commit(category_ids=(), bump_version=False):
+    connection = transaction.get_connection()
+    pending = getattr(connection, 'shop_after_commit', None)
+    work = pending() if pending is not None and connection.in_atomic_block else None
+
+    registered = work is not None
+    if work is None:
+        work = AfterCommit(connection)
+    if category_ids is None or work.category_ids is None:
+        work.category_ids = None
+    else:
+        work.category_ids.update(category_ids)
+    work.bump_version = work.bump_version or bump_version
+    if not registered:
+        connection.shop_after_commit = weakref.ref(work)
+        transaction.on_commit(work)
+
+
+# category summaries (categories endpoint) are recomputed for the touched categories after commit.
+# a product moved to another category changes both summaries: the category it was loaded with is
+# remembered by Product.from_db, so this needs no query
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def refresh_product_category_summary(sender, instance, created=False, **kwargs):
+    if created or hasattr(instance, '_loaded_category_id'):
+        after_commit({instance.category_id, getattr(instance, '_loaded_category_id', None)} - {None})
+    else:
+        after_commit(None)  # saved without being loaded first, its old category is unknown
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_save, sender=Category)
+def create_category_summary(sender, instance, created, **kwargs):
+    if created:
+        after_commit([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def notify_catalog_changed(sender, **kwargs):
+    catalog_changed.send(sender=sender)
+
+
+# set-based writes don't say which categories changed, recompute all summaries (one grouped query)
+@receiver(catalog_changed)
+def refresh_all_category_summaries(sender, bulk=False, **kwargs):
+    if bulk:
+        after_commit(None)
+
+
+# new catalog version -> every cached response is outdated.
+# bump after commit, otherwise a concurrent read could cache pre-commit data under the new version
+@receiver(catalog_changed)
+def invalidate_response_cache(sender, **kwargs):
+    after_commit(bump_version=True)
+
+
+# keep the autocomplete prefix index in sync row by row
+@receiver(post_save, sender=Product)
+def update_autocomplete_index(sender, instance, **kwargs):
+    autocomplete_index.update(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_autocomplete_index(sender, instance, **kwargs):
+    autocomplete_index.remove(instance.pk)
+
+
+# set-based writes don't say which rows changed, rebuild on next lookup
+@receiver(catalog_changed)
+def invalidate_autocomplete_index(sender, bulk=False, **kwargs):
+    if bulk:
+        autocomplete_index.invalidate()
+
+
+# password change, deactivation or deletion must not keep working through a cached token
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
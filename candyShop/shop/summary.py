@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models import Count, Min, Max
+from .models import Category, CategorySummary, Product
+
+
+SUMMARY_FIELDS = ['product_count', 'min_price', 'max_price', 'latest_updated_at']
+
+
+# recompute CategorySummary rows of the given categories (all categories when None) with one
+# grouped query over the products index on category. the category rows are locked first, so two
+# concurrent refreshes of the same category run one after the other and the last one always sees
+# both writes. categories deleted in the meantime are skipped
+def refresh_category_summaries(category_ids=None):
+    with transaction.atomic():
+        categories = Category.objects.select_for_update().order_by('pk')
+        if category_ids is not None:
+            categories = categories.filter(pk__in=category_ids)
+        locked = list(categories.values_list('pk', flat=True))
+        if not locked:
+            return
+
+        stats = {
+            row['category']: row
+            for row in Product.objects.filter(category__in=locked).values('category').annotate(
+                product_count=Count('id'),
+                min_price=Min('price'),
+                max_price=Max('price'),
+                latest_updated_at=Max('updated_at'),
+            ).order_by()
+        }
+        summaries = [
+            CategorySummary(category_id=pk, **{field: stats[pk][field] for field in SUMMARY_FIELDS})
+            if pk in stats else CategorySummary(category_id=pk)  # empty category: 0 products, no prices
+            for pk in locked
+        ]
+        CategorySummary.objects.bulk_create(
+            summaries, update_conflicts=True, unique_fields=['category'], update_fields=SUMMARY_FIELDS,
+        )
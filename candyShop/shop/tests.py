@@ -1,3 +1,780 @@
-from django.test import TestCase
+import io
+import json
+import re
+import time
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from . import cache as cache_module, throttling
+from .authentication import token_cache
+from .batch import fetch_products
+from .benchmarks import seed_catalog
+from .cache import LocalLRUBackend, CategoryCache, bump_catalog_version
+from .conditional import scope_stats
+from .bulk import import_products
+from .models import Product, Category, CategorySummary, HAS_PRICE_ID, Reservation, ReservationItem
+from .pagination import CursorPaginator, PriceCursorPaginator
+from .reservations import reserve, confirm_payment, expire_reservations
+from .search import POSTGRES_SEARCH_SQL, InMemorySearchBackend
+from .serializers import ProductFastSerializer
+from .throttling import LocalBucketStore
 
-# Create your tests here.
+
+# plan fragments that mean "whole products table scanned" / "rows sorted after fetching"
+BAD_PLAN = {
+    'postgresql': re.compile(r'Seq Scan on shop_product|Sort\b'),
+    'sqlite': re.compile(r'SCAN shop_product(?! USING)|USE TEMP B-TREE'),
+}
+GOOD_PLAN = {
+    'postgresql': re.compile(r'Index (Only )?Scan|Bitmap Index Scan'),
+    'sqlite': re.compile(r'USING (COVERING )?INDEX|USING INTEGER PRIMARY KEY'),
+}
+
+
+class FakeRequest:
+    GET = {}
+
+
+# checks with EXPLAIN that the queries behind each storefront view are served by an index
+# (no full scan, no sort) on a synthetic catalog big enough for the planner to care
+class QueryPlanTests(TestCase):
+    SIZE = 20000
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(cls.SIZE, close_connection=False)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')  # fresh planner statistics for the seeded rows
+
+    def plans(self):
+        fast = ProductFastSerializer()
+        paginator = CursorPaginator(FakeRequest())
+        by_price = PriceCursorPaginator(FakeRequest())
+        by_price_desc = PriceCursorPaginator(FakeRequest(), descending=True)
+        category_id = Category.objects.values_list('id', flat=True).first()
+        some_ids = list(Product.objects.values_list('id', flat=True)[:50])
+
+        queries = {
+            'product_list page': paginator.page_queryset(fast.values(Product.objects.all(), extra=paginator.cursor_columns)),
+            'product_list category page': paginator.page_queryset(
+                fast.values(Product.objects.filter(category_id=category_id), extra=paginator.cursor_columns)),
+            'product_list price page': by_price.page_queryset(fast.values(Product.objects.all(), extra=by_price.cursor_columns)),
+            'product_list -price page': by_price_desc.page_queryset(fast.values(Product.objects.all(), extra=by_price_desc.cursor_columns)),
+            'product_list price range page': by_price.page_queryset(
+                fast.values(Product.objects.filter(price__gte=10, price__lte=20), extra=by_price.cursor_columns)),
+            'product_list category price page': by_price.page_queryset(
+                fast.values(Product.objects.filter(category_id=category_id), extra=by_price.cursor_columns)),
+            'individual_product': fast.values(Product.objects.filter(id=some_ids[0])),
+            'get_multiple_products versions': Product.objects.filter(id__in=some_ids).values_list('id', 'updated_at'),
+            'bulk import price_id lookup': Product.objects.filter(HAS_PRICE_ID, price_id__in=['price_bench_42', 'price_bench_7']),
+        }
+        for name, queryset in queries.items():
+            yield name, queryset.explain(), BAD_PLAN[connection.vendor]
+
+        # ETag aggregates (conditional.py) of the scopes that still run one
+        scopes = {
+            'individual_product validators': Product.objects.filter(id=some_ids[0]),
+            'product_list category validators': Product.objects.filter(category_id=category_id),
+        }
+        for name, scope in scopes.items():
+            with CaptureQueriesContext(connection) as queries:
+                scope_stats(scope)
+            yield name, self.explain_sql(queries[0]['sql']), BAD_PLAN[connection.vendor]
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN ' + POSTGRES_SEARCH_SQL, ['gummy', '%gummy%', 'gummy', 50, 0])
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            # the search query may legitimately sort its (index-found) matches by rank
+            yield 'search_product', plan, re.compile(r'Seq Scan on shop_product')
+
+    @staticmethod
+    def explain_sql(sql):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return '\n'.join(' '.join(map(str, row)) for row in cursor.fetchall())
+
+    def test_storefront_queries_use_indexes(self):
+        if connection.vendor not in BAD_PLAN:
+            self.skipTest(f'no plan rules for {connection.vendor}')
+
+        for name, plan, bad in self.plans():
+            with self.subTest(name):
+                self.assertRegex(plan, GOOD_PLAN[connection.vendor])
+                self.assertNotRegex(plan, bad)
+
+
+# POST /shop/reserve/: the whole cart or nothing, 409 with what's missing, price snapshot for stripe
+@override_settings(SHOP_THROTTLE={**settings.SHOP_THROTTLE, 'ENABLED': False})
+class ReserveStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='gummies')
+        cls.bears = Product.objects.create(name='bears', price='2.50', price_id='price_bears', stock=5, category=category)
+        cls.worms = Product.objects.create(name='worms', price='1.00', stock=1, category=category)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def post_cart(self, *items):
+        return self.client.post('/shop/reserve/', {"items": [{"id": pk, "quantity": quantity} for pk, quantity in items]}, format='json')
+
+    def stock(self, product):
+        return Product.objects.values_list('stock', flat=True).get(pk=product.pk)
+
+    def test_reserves_cart_with_price_snapshot(self):
+        response = self.post_cart((self.bears.id, 3), (self.worms.id, 1))
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['items'], [
+            {"id": self.bears.id, "name": 'bears', "quantity": 3, "unit_price": '2.50', "price_id": 'price_bears'},
+            {"id": self.worms.id, "name": 'worms', "quantity": 1, "unit_price": '1.00', "price_id": None},
+        ])
+        self.assertEqual(body['total'], '8.50')
+        self.assertEqual(Reservation.objects.get(pk=body['reservation']).status, Reservation.PENDING)
+        self.assertEqual((self.stock(self.bears), self.stock(self.worms)), (2, 0))
+
+    def test_short_line_reserves_nothing(self):
+        response = self.post_cart((self.bears.id, 3), (self.worms.id, 2))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((self.stock(self.bears), self.stock(self.worms)), (5, 1))  # bears rolled back too
+        self.assertFalse(Reservation.objects.exists())
+        self.assertFalse(ReservationItem.objects.exists())
+
+    def test_conflict_lists_unavailable_lines(self):
+        response = self.post_cart((self.bears.id, 6), (self.worms.id, 1), (999999, 1))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {
+            "error": 'Insufficient stock.',
+            "unavailable": [
+                {"id": self.bears.id, "requested": 6, "available": 5},
+                {"id": 999999, "requested": 1, "available": None},  # unknown product
+            ],
+        })
+
+    def test_invalid_cart(self):
+        for data in ({}, {"items": []}, {"items": [{"id": 'x'}]}, {"items": [{"id": self.bears.id, "quantity": 0}]}):
+            with self.subTest(data=data):
+                response = self.client.post('/shop/reserve/', data, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(self.bears), 5)
+
+
+class ExpireReservationsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='gummies')
+        cls.product = Product.objects.create(name='bears', price='2.50', stock=20, category=category)
+
+    def reserve(self, quantity, ttl):
+        reservation, _ = reserve({self.product.id: quantity}, ttl=ttl)
+        return reservation
+
+    def test_expires_in_batches_and_returns_stock(self):
+        expired = [self.reserve(2, timedelta(minutes=1)) for _ in range(5)]
+        pending = self.reserve(3, timedelta(hours=1))
+        paid = self.reserve(4, timedelta(minutes=1))
+        self.assertTrue(confirm_payment(paid.id))
+
+        count = expire_reservations(batch_size=2, now=timezone.now() + timedelta(minutes=5))
+
+        self.assertEqual(count, 5)  # three batches
+        self.assertEqual(
+            set(Reservation.objects.filter(status=Reservation.EXPIRED).values_list('id', flat=True)),
+            {reservation.id for reservation in expired},
+        )
+        self.assertEqual(Reservation.objects.get(pk=pending.pk).status, Reservation.PENDING)
+        self.assertEqual(Reservation.objects.get(pk=paid.pk).status, Reservation.PAID)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 20 - 3 - 4)
+
+    def test_nothing_to_expire(self):
+        self.reserve(2, timedelta(hours=1))
+        self.assertEqual(expire_reservations(batch_size=2), 0)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 18)
+
+
+# marking a reservation paid vs expiry: whichever comes first wins
+class ConfirmPaymentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='gummies')
+        cls.product = Product.objects.create(name='bears', price='2.50', stock=10, category=category)
+        cls.user = User.objects.create_user('payments', password='x')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.reservation, _ = reserve({self.product.id: 4}, ttl=timedelta(minutes=15))
+
+    def stock(self):
+        return Product.objects.get(pk=self.product.pk).stock
+
+    def status_of(self):
+        return Reservation.objects.get(pk=self.reservation.pk).status
+
+    def confirm(self):
+        return self.client.post(f'/shop/reserve/{self.reservation.id}/paid/')
+
+    def test_paid_reservation_keeps_its_stock(self):
+        response = self.confirm()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"reservation": str(self.reservation.id), "status": Reservation.PAID})
+        self.assertEqual(expire_reservations(now=timezone.now() + timedelta(hours=1)), 0)
+        self.assertEqual(self.status_of(), Reservation.PAID)
+        self.assertEqual(self.stock(), 6)
+
+    def test_repeated_confirmation_is_ok(self):
+        self.confirm()
+        response = self.confirm()  # webhook retry
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.status_of(), Reservation.PAID)
+
+    def test_late_payment_after_expiry_is_refused(self):
+        expire_reservations(now=timezone.now() + timedelta(hours=1))
+
+        response = self.confirm()
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.status_of(), Reservation.EXPIRED)
+        self.assertEqual(self.stock(), 10)
+
+    def test_late_payment_before_expiry_run_is_refused(self):
+        # past expires_at but not swept yet: still refused, so the sweep can't hand the stock back after payment
+        self.assertFalse(confirm_payment(self.reservation.id, now=timezone.now() + timedelta(hours=1)))
+        self.assertEqual(self.status_of(), Reservation.PENDING)
+
+    def test_unknown_reservation(self):
+        response = self.client.post('/shop/reserve/00000000-0000-0000-0000-000000000000/paid/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_authentication(self):
+        response = APIClient().post(f'/shop/reserve/{self.reservation.id}/paid/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.status_of(), Reservation.PENDING)
+
+
+def jsonl(*rows):
+    return io.StringIO(''.join(json.dumps(row) + '\n' for row in rows))
+
+
+# bulk import: every row ends up created, updated or failed (with its row number)
+class ImportProductsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='gummies')
+        Product.objects.create(name='old bears', price='1.00', price_id='price_bears', category=cls.category)
+
+    def row(self, name, price_id=None, **extra):
+        return {"name": name, "description": 'sweet', "image_url": 'https://example.com/a.png', "price": '2.00', "price_id": price_id, "category": self.category.id, **extra}
+
+    def assertCounts(self, report, rows, created, updated, failed):
+        self.assertEqual(
+            (report['rows'], report['created'], report['updated'], report['failed']), (rows, created, updated, failed),
+        )
+        self.assertEqual(report['rows'], report['created'] + report['updated'] + report['failed'])
+
+    def test_counts_and_row_errors(self):
+        report = import_products(jsonl(
+            self.row('bears', 'price_bears'),
+            self.row('worms', 'price_worms'),
+            self.row('no price', price='x'),
+            self.row('no key'),
+        ), 'jsonl', batch_size=2)
+
+        self.assertCounts(report, 4, 2, 1, 1)
+        self.assertEqual([error['row'] for error in report['errors']], [3])
+        self.assertIn('price', report['errors'][0]['errors'])
+        self.assertEqual(Product.objects.get(price_id='price_bears').name, 'bears')
+
+    def test_invalid_json_line(self):
+        stream = io.StringIO(json.dumps(self.row('bears')) + '\nnot json\n')
+        report = import_products(stream, 'jsonl')
+        self.assertCounts(report, 2, 1, 0, 1)
+        self.assertEqual(report['errors'][0]['row'], 2)
+
+    def test_duplicate_price_id_in_batch_is_reported(self):
+        report = import_products(jsonl(
+            self.row('worms', 'price_worms'),
+            self.row('worms again', 'price_worms'),
+            self.row('bears', 'price_bears'),
+            self.row('bears again', 'price_bears'),
+        ), 'jsonl')
+
+        self.assertCounts(report, 4, 1, 1, 2)
+        self.assertEqual(
+            report['errors'],
+            [
+                {"row": 2, "errors": {"price_id": ['Duplicate price_id, already in row 1.']}},
+                {"row": 4, "errors": {"price_id": ['Duplicate price_id, already in row 3.']}},
+            ],
+        )
+        self.assertEqual(Product.objects.get(price_id='price_worms').name, 'worms')
+
+
+# database errors surface when the batch commits, so this needs real transactions
+class ImportDatabaseErrorTests(TransactionTestCase):
+    def test_refused_rows_fail_without_losing_the_batch(self):
+        category = Category.objects.create(id=2, name='gummies')
+        rows = [
+            {"name": 'bears', "description": 'sweet', "image_url": 'https://example.com/a.png', "price": '1.00', "category": category.id},
+            {"name": 'no category', "description": 'sweet', "image_url": 'https://example.com/a.png', "price": '1.00'},  # model default category 1 doesn't exist
+        ]
+
+        report = import_products(jsonl(*rows), 'jsonl')
+
+        self.assertEqual((report['created'], report['failed']), (1, 1))
+        self.assertEqual(report['errors'][0]['row'], 2)
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['bears'])
+
+
+# stock after creation only moves relatively (stock_delta), so units held by reservations aren't overwritten
+class StockDeltaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='gummies')
+        cls.bears = Product.objects.create(name='bears', price='2.50', price_id='price_bears', stock=5, category=cls.category)
+        cls.worms = Product.objects.create(name='worms', price='1.00', stock=1, category=cls.category)
+        cls.user = User.objects.create_user('admin', password='x')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stock(self, product):
+        return Product.objects.values_list('stock', flat=True).get(pk=product.pk)
+
+    def test_initial_stock_on_create(self):
+        response = self.client.post('/shop/add_product/', {
+            "name": 'mints', "description": 'fresh', "image_url": 'https://example.com/m.png', "price": '1.00',
+            "category": self.category.id, "stock": 7,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['stock'], 7)
+
+    def test_update_adds_and_removes_units(self):
+        reserve({self.bears.id: 2})  # held units survive the adjustment
+        response = self.client.patch(f'/shop/update_product/{self.bears.id}/', {"stock_delta": 10}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stock'], 13)
+
+        response = self.client.patch(f'/shop/update_product/{self.bears.id}/', {"stock_delta": -20, "name": 'renamed'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(self.bears), 13)
+        self.assertEqual(Product.objects.get(pk=self.bears.pk).name, 'bears')  # rolled back with the delta
+
+    def test_update_rejects_absolute_stock(self):
+        response = self.client.patch(f'/shop/update_product/{self.bears.id}/', {"stock": 50}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('stock', response.json())
+        self.assertEqual(self.stock(self.bears), 5)
+
+    def test_bulk_update_delta(self):
+        response = self.client.patch('/shop/bulk_update/', {"category": 'gummies', "changes": {"stock_delta": 3}}, format='json')
+        self.assertEqual(response.json(), {"updated": 2})
+        self.assertEqual((self.stock(self.bears), self.stock(self.worms)), (8, 4))
+
+    def test_bulk_update_delta_is_all_or_nothing(self):
+        response = self.client.patch('/shop/bulk_update/', {"category": 'gummies', "changes": {"stock_delta": -2}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('stock_delta', response.json())
+        self.assertEqual((self.stock(self.bears), self.stock(self.worms)), (5, 1))
+
+    def test_import_delta(self):
+        row = {"description": 'sweet', "image_url": 'https://example.com/a.png', "price": '2.50', "category": self.category.id}
+        report = import_products(jsonl(
+            {**row, "name": 'bears', "price_id": 'price_bears', "stock_delta": 4},
+            {**row, "name": 'mints', "price_id": 'price_mints', "stock_delta": 6},
+            {**row, "name": 'fizz', "price_id": 'price_fizz', "stock_delta": -1},
+            {**row, "name": 'absolute', "stock": 3},
+        ), 'jsonl')
+
+        self.assertEqual((report['created'], report['updated'], report['failed']), (1, 1, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [4, 3])
+        self.assertEqual(self.stock(self.bears), 9)
+        self.assertEqual(Product.objects.get(price_id='price_mints').stock, 6)
+
+
+# ETag / Last-Modified (conditional.py): 304 while nothing changed, a full response after a write.
+# writes commit for real, the catalog version moves after commit
+@override_settings(SHOP_THROTTLE={**settings.SHOP_THROTTLE, 'ENABLED': False})
+class ConditionalGetTests(TransactionTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='gummies')
+        self.bears = Product.objects.create(name='sour bears', description='gummy', price='2.50', category=self.category)
+        self.user = User.objects.create_user('admin', password='x')
+        self.client = APIClient()
+
+    def revalidate(self, path):
+        etag = self.client.get(path)['ETag']
+        return etag, self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    def write(self):
+        admin = APIClient()
+        admin.force_authenticate(self.user)
+        response = admin.patch(f'/shop/update_product/{self.bears.id}/', {"price": str(Decimal(self.bears.price) + 1)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.bears.refresh_from_db()
+
+    def test_not_modified_until_a_write(self):
+        for path in ('/shop/products/', '/shop/products/?limit=10', f'/shop/individual_product/{self.bears.id}/',
+                     '/shop/search_product/?search_product=sour'):
+            with self.subTest(path):
+                etag, response = self.revalidate(path)
+                self.assertEqual(response.status_code, 304)
+
+                self.write()
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    async def test_async_routes(self):
+        for path in ('/shop/async/products/', '/shop/async/products/?limit=10',
+                     f'/shop/async/individual_product/{self.bears.id}/', '/shop/async/search_product/?search_product=sour'):
+            with self.subTest(path):
+                client = AsyncClient()
+                etag = (await client.get(path))['ETag']
+                response = await client.get(path, headers={'if-none-match': etag})
+                self.assertEqual(response.status_code, 304)
+
+                await sync_to_async(self.write)()
+                response = await client.get(path, headers={'if-none-match': etag})
+                self.assertEqual(response.status_code, 200)
+
+    def test_search_and_pages_validate_without_an_aggregate(self):
+        for path in ('/shop/products/?limit=10', '/shop/search_product/?search_product=sour'):
+            with self.subTest(path), CaptureQueriesContext(connection) as queries:
+                self.client.get(path)
+            self.assertFalse([query for query in queries if 'MAX(' in query['sql'].upper()])
+
+
+# after-commit work (signals.py): once per transaction, dropped with a rolled-back savepoint
+class AfterCommitTests(TransactionTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='gummies')
+
+    def create(self, name):
+        return Product.objects.create(name=name, price='1.00', category=self.category)
+
+    def test_one_bump_per_transaction(self):
+        with mock.patch('shop.signals.bump_catalog_version') as bump:
+            with transaction.atomic():
+                for name in ('a', 'b', 'c'):
+                    self.create(name)
+                self.assertEqual(bump.call_count, 0)  # not before commit
+            self.assertEqual(bump.call_count, 1)
+
+            with transaction.atomic():
+                self.create('d')
+            self.assertEqual(bump.call_count, 2)  # the next transaction registers its own
+
+    def test_rolled_back_savepoint(self):
+        with mock.patch('shop.signals.bump_catalog_version') as bump:
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        self.create('gone')
+                        raise ValueError
+                except ValueError:
+                    pass
+                self.create('kept')  # the dropped callback isn't reused
+            self.assertEqual(bump.call_count, 1)
+
+            with transaction.atomic():
+                self.create('outer')
+                try:
+                    with transaction.atomic():
+                        self.create('gone')
+                        raise ValueError
+                except ValueError:
+                    pass
+            self.assertEqual(bump.call_count, 2)  # the outer callback survives the inner rollback
+
+        self.assertEqual(
+            CategorySummary.objects.get(category=self.category).product_count, 2,
+        )
+
+
+# per-product entries (batch.py) live in their own LRU next to the response cache
+@override_settings(SHOP_THROTTLE={**settings.SHOP_THROTTLE, 'ENABLED': False})
+class ProductCacheTests(TestCase):
+    def test_large_carts_dont_evict_catalog_pages(self):
+        seed_catalog(60, close_connection=False)
+        ids = list(Product.objects.values_list('id', flat=True))
+        responses = LocalLRUBackend(max_entries=10)
+        with mock.patch.object(cache_module, '_backend', responses), mock.patch.object(cache_module, '_product_backend', None):
+            APIClient().get('/shop/products/?limit=5')
+            for start in range(0, len(ids), 20):
+                fetch_products(ids[start:start + 20])
+
+            self.assertTrue(any(key.startswith('shop:response:') for key in responses._data))
+            self.assertFalse(any(key.startswith('shop:product:') for key in responses._data))
+            self.assertEqual(len(cache_module.get_product_cache()._data), len(ids))
+
+
+class CategoryCacheTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='gummies')
+        self.cache = CategoryCache()
+
+    def test_unknown_names_are_remembered(self):
+        with self.assertNumQueries(2):  # one load per unknown key
+            self.assertIsNone(self.cache.get_id('made-up'))
+            self.assertIsNone(self.cache.get_id('made-up'))
+            self.assertEqual(self.cache.get_id('gummies'), self.category.id)
+            self.assertFalse(self.cache.has_id(self.category.id + 1))
+            self.assertFalse(self.cache.has_id(self.category.id + 1))
+
+    def test_invalidation_forgets_misses(self):
+        self.assertIsNone(self.cache.get_id('mints'))
+        mints = Category.objects.create(name='mints')
+        self.cache.invalidate()  # what the Category post_save signal does for the shared instance
+        self.assertEqual(self.cache.get_id('mints'), mints.id)
+
+    def test_misses_expire(self):
+        self.assertIsNone(self.cache.get_id('mints'))
+        mints = Category.objects.create(name='mints')  # e.g. by another worker, no local invalidation
+        with mock.patch('shop.cache.time.monotonic', return_value=time.monotonic() + CategoryCache.MISS_TTL + 1):
+            self.assertEqual(self.cache.get_id('mints'), mints.id)
+
+
+# versioned response cache (cache.py): served from the cache until a write commits, then rebuilt
+@override_settings(SHOP_THROTTLE={**settings.SHOP_THROTTLE, 'ENABLED': False})
+class ResponseCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='gummies')
+        self.bears = Product.objects.create(name='bears', price='2.50', category=self.category)
+        self.worms = Product.objects.create(name='worms', price='1.00', category=self.category)
+        self.client = APIClient()
+        self.admin = APIClient()
+        self.admin.force_authenticate(User.objects.create_user('admin', password='x'))
+
+    def names(self):
+        return sorted(product['name'] for product in self.client.get('/shop/products/?sort=price').json())
+
+    def prices(self):
+        return {product['name']: product['price'] for product in self.client.get('/shop/products/').json()}
+
+    def test_served_from_cache(self):
+        self.client.get('/shop/products/')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/shop/products/')
+        self.assertFalse([query for query in queries if 'FROM "shop_product"' in query['sql']])
+
+    def test_patch(self):
+        self.assertEqual(self.prices()['bears'], '2.50')
+        self.admin.patch(f'/shop/update_product/{self.bears.id}/', {"price": '3.00'}, format='json')
+        self.assertEqual(self.prices()['bears'], '3.00')
+
+    def test_bulk_update(self):
+        self.prices()
+        self.admin.patch('/shop/bulk_update/', {"category": 'gummies', "changes": {"price": '9.99'}}, format='json')
+        self.assertEqual(self.prices(), {"bears": '9.99', "worms": '9.99'})
+
+    def test_delete(self):
+        self.assertEqual(self.names(), ['bears', 'worms'])
+        self.admin.delete(f'/shop/delete_product/{self.worms.id}/')
+        self.assertEqual(self.names(), ['bears'])
+        self.admin.delete('/shop/bulk_delete/', {"ids": [self.bears.id]}, format='json')
+        self.assertEqual(self.names(), [])
+
+
+# the pure python search index used on sqlite (search.py)
+class InMemorySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='gummies')
+        cls.bears = Product.objects.create(name='Sour Gummy Bears', description='chewy', price='1.00', category=category)
+        cls.worms = Product.objects.create(name='Worms', description='sour gummy worms', price='1.00', category=category)
+        cls.mints = Product.objects.create(name='Mints', description='fresh', price='1.00', category=category)
+
+    def setUp(self):
+        self.backend = InMemorySearchBackend()
+
+    def search(self, query, limit=50, offset=0):
+        return [product.name for product in self.backend.search(query, limit, offset)]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('sour gummy'), ['Sour Gummy Bears', 'Worms'])
+
+    def test_prefix_and_substring_matches(self):
+        self.assertEqual(self.search('gum'), ['Sour Gummy Bears', 'Worms'])  # word prefix
+        self.assertEqual(self.search('ears'), ['Sour Gummy Bears'])  # inside the name, like icontains
+
+    def test_every_word_has_to_match(self):
+        self.assertEqual(self.search('gummy fresh'), [])
+
+    def test_limit_offset(self):
+        self.assertEqual(self.search('gummy', limit=1, offset=1), ['Worms'])
+
+    def test_rebuilt_after_a_catalog_change(self):
+        self.assertEqual(self.search('fresh'), ['Mints'])
+        Product.objects.filter(pk=self.mints.pk).update(description='strong')
+        bump_catalog_version()
+        self.assertEqual(self.search('fresh'), [])
+
+    def test_search_view_uses_it(self):
+        with override_settings(SHOP_THROTTLE={**settings.SHOP_THROTTLE, 'ENABLED': False}):
+            response = APIClient().get('/shop/search_product/?search_product=worm')
+        self.assertEqual([product['name'] for product in response.json()], ['Worms'])
+
+
+# keyset pagination (pagination.py): inserts between page requests don't shift the later pages
+@override_settings(SHOP_THROTTLE={**settings.SHOP_THROTTLE, 'ENABLED': False})
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='gummies')
+        for i in range(7):
+            Product.objects.create(name=f'p{i}', price=f'{i + 1}.00', category=cls.category)
+
+    def walk(self, query, insert_price):
+        client, names, cursor, inserted = APIClient(), [], None, 0
+        while True:
+            path = f'/shop/products/?limit=2&fields=name{query}' + (f'&cursor={cursor}' if cursor else '')
+            body = client.get(path).json()
+            names += [product['name'] for product in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                return names
+            inserted += 1
+            Product.objects.create(name=f'new{inserted}', price=insert_price, category=self.category)
+
+    def test_newest_first(self):
+        names = self.walk('', '1.00')
+        self.assertEqual(names, [f'p{i}' for i in reversed(range(7))])  # new rows sort before the cursor
+
+    def test_by_price(self):
+        names = self.walk('&sort=price', '0.50')
+        self.assertEqual(names, [f'p{i}' for i in range(7)])
+
+    def test_invalid_cursor(self):
+        response = APIClient().get('/shop/products/?limit=2&cursor=nonsense')
+        self.assertEqual(response.status_code, 400)
+
+
+# cache of verified access tokens (authentication.py)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user('admin', password='x')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def request(self):
+        return self.client.delete('/shop/delete_product/999999/')  # authenticated, 404 without touching data
+
+    def test_cached_token_skips_the_user_query(self):
+        with self.assertNumQueries(2):  # user + product
+            self.assertEqual(self.request().status_code, 404)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.request().status_code, 404)
+
+    def test_deactivated_user_is_rejected(self):
+        self.request()  # token cached
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.request().status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.request()
+        self.user.delete()
+        self.assertEqual(self.request().status_code, 401)
+
+    def test_invalid_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer nonsense')
+        self.assertEqual(self.request().status_code, 401)
+
+
+# cart batch fetch (batch.py): request order, no duplicates, missing ids in a header
+@override_settings(SHOP_THROTTLE={**settings.SHOP_THROTTLE, 'ENABLED': False})
+class GetMultipleProductsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='gummies')
+        cls.ids = [Product.objects.create(name=f'p{i}', price='1.00', category=category).id for i in range(3)]
+
+    def post(self, ids, path='/shop/get_multiple_products/'):
+        return APIClient().post(path, {"ids": ids}, format='json')
+
+    def test_order_duplicates_and_missing(self):
+        a, b, c = self.ids
+        for path in ('/shop/get_multiple_products/', '/shop/async/get_multiple_products/'):
+            with self.subTest(path):
+                response = self.post([c, 999998, a, c, 'x', b, 999999], path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([product['id'] for product in response.json()], [c, a, b])
+                self.assertEqual(response['X-Missing-Product-Ids'], '999998,999999')
+
+    def test_cached_products_are_the_same(self):
+        first = self.post(self.ids).json()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.post(self.ids).json()
+        self.assertEqual(first, second)
+        self.assertEqual(len(queries), 1)  # only the (id, updated_at) lookup, products come from the cache
+
+    def test_no_header_when_all_found(self):
+        self.assertNotIn('X-Missing-Product-Ids', self.post(self.ids))
+
+    def test_invalid_input(self):
+        for ids in ([], 'nope', ['x', -1]):
+            with self.subTest(ids=ids):
+                self.assertEqual(self.post(ids).status_code, 400)
+
+
+# token buckets (throttling.py) with a burst of 3 and practically no refill during the test
+@override_settings(SHOP_THROTTLE={
+    **settings.SHOP_THROTTLE, 'ENABLED': True, 'STORE': 'local',
+    'CLIENT_RATE': 0.001, 'CLIENT_BURST': 3, 'GLOBAL_RATE': 0.001, 'GLOBAL_BURST': 5,
+})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(throttling, '_store', LocalBucketStore())  # fresh buckets per test
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, path='/shop/autocomplete/?q=a', ip='10.0.0.1'):
+        return APIClient().get(path, REMOTE_ADDR=ip)
+
+    def test_client_burst_then_429(self):
+        self.assertEqual([self.get().status_code for _ in range(4)], [200, 200, 200, 429])
+        response = self.get()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    def test_buckets_are_per_client(self):
+        for _ in range(3):
+            self.get()
+        self.assertEqual(self.get(ip='10.0.0.2').status_code, 200)
+
+    def test_global_bucket(self):
+        codes = [self.get(ip=f'10.0.1.{i}').status_code for i in range(6)]
+        self.assertEqual(codes, [200] * 5 + [429])
+
+    def test_expensive_requests_cost_more(self):
+        self.assertEqual(self.get('/shop/search_product/?search_product=x').status_code, 404)  # 5 tokens, capped at the burst
+        self.assertEqual(self.get().status_code, 429)
+
+    def test_async_routes(self):
+        codes = [self.get('/shop/async/individual_product/999999/').status_code for _ in range(4)]
+        self.assertEqual(codes, [404, 404, 404, 429])
+        self.assertIn('Retry-After', self.get('/shop/async/individual_product/999999/'))
+
+    def test_forwarded_for_is_ignored(self):
+        for i in range(3):
+            APIClient().get('/shop/autocomplete/?q=a', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'1.2.3.{i}')
+        response = APIClient().get('/shop/autocomplete/?q=a', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.99')
+        self.assertEqual(response.status_code, 429)
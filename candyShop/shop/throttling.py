@@ -0,0 +1,138 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+
+
+# token bucket state (tokens left, last refill time) per key.
+# in-process by default; with SHOP_THROTTLE['STORE'] set to a CACHES alias (e.g. redis) all workers
+# share the buckets. the shared store reads and writes without a lock, so concurrent requests from
+# one client can occasionally both pass, which is fine for rate limiting
+class LocalBucketStore:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    # takes `cost` tokens if available, returns seconds to wait until they would be (0 = allowed)
+    def consume(self, key, cost, rate, capacity):
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens, wait = take(tokens, now - updated_at, cost, rate, capacity)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)  # least recently seen client, its bucket has refilled by now
+            return wait
+
+
+class CacheBucketStore:
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def consume(self, key, cost, rate, capacity):
+        now = time.time()
+        key = f'shop:bucket:{key}'
+        tokens, updated_at = self.cache.get(key) or (capacity, now)
+        tokens, wait = take(tokens, max(0.0, now - updated_at), cost, rate, capacity)
+        self.cache.set(key, (tokens, now), math.ceil(capacity / rate) + 1)  # expires once it would be full again
+        return wait
+
+
+# refill for `elapsed` seconds, then try to take `cost` tokens: (tokens left, seconds to wait)
+def take(tokens, elapsed, cost, rate, capacity):
+    tokens = min(capacity, tokens + elapsed * rate)
+    cost = min(cost, capacity)  # a request costing more than the burst could never pass
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / rate
+
+
+_store = None
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        alias = throttle_settings().get('STORE', 'local')
+        _store = LocalBucketStore() if alias == 'local' else CacheBucketStore(alias)
+    return _store
+
+
+def throttle_settings():
+    return getattr(settings, 'SHOP_THROTTLE', {})
+
+
+# cost of a request in tokens, by url name (SHOP_THROTTLE['COSTS']), so expensive endpoints
+# (search, full exports) drain the bucket faster than a single product page.
+# the async_ routes cost the same as their DRF counterparts
+def request_cost(request):
+    match = getattr(request, 'resolver_match', None)
+    name = match.url_name.removeprefix('async_') if match and match.url_name else None
+    return throttle_settings().get('COSTS', {}).get(name, 1)
+
+
+# per client (user id when authenticated, otherwise IP) token bucket:
+# CLIENT_RATE tokens/second, bursts up to CLIENT_BURST. over the limit -> 429 with Retry-After
+class ClientTokenBucketThrottle(BaseThrottle):
+    rate_setting = 'CLIENT_RATE'
+    burst_setting = 'CLIENT_BURST'
+
+    def allow_request(self, request, view):
+        config = throttle_settings()
+        if not config.get('ENABLED', True):
+            return True
+        if getattr(request, 'shop_throttled', False):
+            return True  # already rejected by an earlier throttle, don't charge this bucket too
+
+        rate, capacity = config[self.rate_setting], config[self.burst_setting]
+        self.wait_seconds = get_bucket_store().consume(self.get_key(request), request_cost(request), rate, capacity)
+        if self.wait_seconds:
+            request.shop_throttled = True
+        return self.wait_seconds == 0
+
+    def get_key(self, request):
+        # plain django requests (async views) don't authenticate, request.user would be a sync session lookup
+        if isinstance(request, Request) and request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def wait(self):
+        return self.wait_seconds
+
+
+# one bucket shared by all clients: caps the total load the public endpoints put on the database
+class GlobalTokenBucketThrottle(ClientTokenBucketThrottle):
+    rate_setting = 'GLOBAL_RATE'
+    burst_setting = 'GLOBAL_BURST'
+
+    def get_key(self, request):
+        return 'global'
+
+
+PUBLIC_THROTTLES = [ClientTokenBucketThrottle, GlobalTokenBucketThrottle]  # client first, see allow_request
+
+
+# the same buckets for the plain async views in async_views.py, which DRF's throttling doesn't
+# reach. over the limit -> 429 with Retry-After and DRF's error body
+def throttle_public(view_func):
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        throttles = [throttle_class() for throttle_class in PUBLIC_THROTTLES]
+        waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(request, None)]
+        if waits:
+            wait = math.ceil(max(waits))
+            response = JsonResponse(
+                {"detail": f"Request was throttled. Expected available in {wait} second{'' if wait == 1 else 's'}."},
+                status=429,
+            )
+            response['Retry-After'] = str(wait)
+            return response
+        return await view_func(request, *args, **kwargs)
+    return wrapper
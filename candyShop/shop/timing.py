@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+# timings of the current request, set by InstrumentationMiddleware (None when it isn't active)
+current_timings = ContextVar('shop_request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self._rendering = False
+
+    # connection.execute_wrapper hook, wraps every sql statement of the request
+    def query_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+# adds the time spent in the block to the request's render time (serializers, JSON encoding),
+# minus the queries it runs (lazy querysets are often evaluated while serializing, that time
+# stays db time). nested blocks count once, no-op outside an instrumented request
+@contextmanager
+def render_timer():
+    timings = current_timings.get()
+    if timings is None or timings._rendering:
+        yield
+        return
+
+    timings._rendering = True
+    started, db_seconds = time.perf_counter(), timings.db_seconds
+    try:
+        yield
+    finally:
+        timings._rendering = False
+        timings.render_seconds += (time.perf_counter() - started) - (timings.db_seconds - db_seconds)
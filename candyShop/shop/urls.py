@@ -1,14 +1,31 @@
 # shop/urls.py 
 from django.urls import path
-from .views import product_list, add_product, delete_product, update_product, add_category, individual_product, search_product, get_multiple_products
+from . import async_views
+from .views import product_list, add_product, delete_product, update_product, add_category, individual_product, search_product, get_multiple_products, autocomplete, bulk_import_products, bulk_delete, bulk_update, export_products, metrics, category_list, reserve_stock, confirm_reservation, product_stock
 
 urlpatterns = [
     path('products/', product_list, name='product_list'), #endpoint to query all product entries
     path('add_product/', add_product, name='add-product'), #add a new product to db
+    path('categories/', category_list, name='category_list'), # categories with product count, min/max price and latest update (for navigation)
     path('add_category/', add_category, name='add_category'),  # endpoint to add new categories (pass json in body {"name": "category"})
     path('delete_product/<int:product_id>/', delete_product, name='delete_product'), # delete product by id, passed from frontend
     path('update_product/<int:product_id>/', update_product, name='update_product'), # update product by id, passed from frontend
     path('individual_product/<int:product_id>/', individual_product, name='individual_product'), # retrive specific product, with product_id passed with url from client
     path('search_product/', search_product, name='search_product'), # search in product table using query
     path('get_multiple_products/', get_multiple_products, name='get_multiple_products'),
+    path('bulk_import_products/', bulk_import_products, name='bulk_import_products'), # upsert many products from a .jsonl/.csv upload (multipart field "file")
+    path('bulk_delete/', bulk_delete, name='bulk_delete'), # delete many products, body {"ids": [...]} and/or {"category": "name"}
+    path('bulk_update/', bulk_update, name='bulk_update'), # patch many products, same selection plus {"changes": {...}}
+    path('reserve/', reserve_stock, name='reserve_stock'), # checkout: reserve stock for a cart, returns price/price_id snapshot for stripe
+    path('reserve/<uuid:reservation_id>/paid/', confirm_reservation, name='confirm_reservation'), # payment backend: mark a reservation paid (409 once expired)
+    path('stock/', product_stock, name='product_stock'), # live stock of products (?ids=1,2,3), kept out of the cached catalog responses
+    path('export_products/', export_products, name='export_products'), # stream whole catalog (?file_format=ndjson|json)
+    path('autocomplete/', autocomplete, name='autocomplete'), # search-as-you-type suggestions (?q=...), returns id/name pairs
+    path('metrics/', metrics, name='metrics'), # per-view query/timing counters for prometheus (SHOP_INSTRUMENTATION=True)
+
+    # async versions of the public catalog endpoints (same params/responses), for ASGI deployments
+    path('async/products/', async_views.product_list, name='async_product_list'),
+    path('async/individual_product/<int:product_id>/', async_views.individual_product, name='async_individual_product'),
+    path('async/search_product/', async_views.search_product, name='async_search_product'),
+    path('async/get_multiple_products/', async_views.get_multiple_products, name='async_get_multiple_products'),
 ]
\ No newline at end of file
@@ -1,10 +1,24 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Product, Category
-from .serializers import ProductSerializer, CategorySerializer
-from django.http import JsonResponse
+from .models import Product, Category, CategorySummary, Reservation
+from .serializers import ProductSerializer, CategorySerializer, CategorySummarySerializer, ProductFastSerializer, parse_product_fields, PUBLIC_PRODUCT_FIELDS
+from .pagination import InvalidParameter
+from .filters import ProductListParams, facet_rows, build_facets
+from .cache import category_cache, cache_response
+from .conditional import condition_on_catalog, CATALOG_VERSION
+from .search import search_products, parse_limit_offset, SEARCH_PARAMS
+from .autocomplete import autocomplete_index
+from .bulk import import_products, detect_format, ImportFormatError, DEFAULT_BATCH_SIZE, select_products, bulk_delete_products, bulk_update_products
+from .export import iter_catalog, EXPORT_FORMATS
+from .batch import fetch_products, clean_ids, MAX_IDS
+from .middleware import request_metrics
+from .throttling import PUBLIC_THROTTLES
+from .reservations import parse_cart, reserve, confirm_payment, parse_stock_delta, adjust_stock, OutOfStock, MAX_CART_LINES
+from django.conf import settings
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 import json
 # env import
@@ -15,23 +29,71 @@ import environ
 env = environ.Env()
 environ.Env.read_env()
 
+# category ids for the "?category=" names (None = no category filter), raises Category.DoesNotExist for unknown names
+def requested_category_ids(params):
+    if not params.categories:
+        return None
+    category_ids = [category_cache.get_id(name) for name in params.categories]  # cached name -> id, no extra Category query
+    if None in category_ids:
+        raise Category.DoesNotExist
+    return category_ids
+
+# rows behind each cacheable GET response (used for ETag/Last-Modified, see conditional.py)
+def product_list_scope(request):
+    try:
+        params = ProductListParams(request)
+        category_ids = None if params.facets else requested_category_ids(params)  # facets count every category
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            return CATALOG_VERSION  # a page shouldn't pay for an aggregate over the whole category/catalog
+        return params.filter(Product.objects.all(), category_ids)
+    except (Category.DoesNotExist, InvalidParameter):
+        return None
+
+def individual_product_scope(request, product_id):
+    return Product.objects.filter(id=product_id)
+
+def search_product_scope(request):
+    # ranking can shift with any catalog change, so validate against the catalog version
+    return CATALOG_VERSION if request.GET.get('search_product') else None
+
 # get products for main page, filter logic included
+# optional query params:
+#   ?fields=name,price     -> only select/serialize these fields (id is always included)
+#   ?limit=24&cursor=...   -> cursor pagination (in ?sort= order, newest first by default), returns {"results": [...], "next_cursor": "..."}
+#   ?category=a&category=b, ?min_price=, ?max_price=, ?sort=newest|price|-price, ?facets=1 -> see filters.py
+#                          with facets the response is {"results": [...], "facets": {...}} (plus "next_cursor" when paginated)
 @api_view(['GET'])
 @permission_classes([AllowAny])  # allow anyone to access this view
+@throttle_classes(PUBLIC_THROTTLES)  # token buckets per client + global (throttling.py)
+@condition_on_catalog(product_list_scope, ProductListParams.QUERY_PARAMS)
+@cache_response(*ProductListParams.QUERY_PARAMS)
 def product_list(request):
     try:
-        category_name = request.GET.get('category')  # get category (if available) from query parameter
+        fields = parse_product_fields(request.GET.get('fields'))  # requested fields (None = all)
+        params = ProductListParams(request)
+        category_ids = requested_category_ids(params)
+        products = params.filter(Product.objects.all(), category_ids)  # all products, or only the requested ones
+
+        serializer = ProductFastSerializer(fields)  # same output as ProductSerializer, straight from .values()
 
-        # if category exist
-        if category_name:
-            category = Category.objects.get(name=category_name)
-            products = Product.objects.filter(category=category)  # filter products by category
+        # paginate only when client asks for it, so the plain list response keeps working for the current frontend
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            paginator = params.paginator(request)
+            page, next_cursor = paginator.paginate(serializer.values(products, extra=paginator.cursor_columns))
+            data = {"results": serializer.to_representation(page), "next_cursor": next_cursor}
         else:
-            products = Product.objects.all()  # query all products if no category is specified
+            rows = serializer.values(params.order(products))  # SELECT only the requested columns
+            data = serializer.to_representation(rows)
 
-        serializer = ProductSerializer(products, many=True)  # serialize the queryset
-        return Response(serializer.data)  # return the serialized data as JSON response to frontend
+        if params.facets:
+            facets = build_facets(facet_rows(params.filter_price(Product.objects.all())), category_ids)  # one GROUP BY category query
+            data = {**data, "facets": facets} if isinstance(data, dict) else {"results": data, "facets": facets}
+        return Response(data)  # return the serialized data as JSON response to frontend
     
+    # bad fields/limit/cursor parameter
+    except InvalidParameter as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     # if specified category doesnt exist
     except Category.DoesNotExist:
         return Response({"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
@@ -40,6 +102,19 @@ def product_list(request):
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# categories for the storefront navigation with product count, price range and latest update,
+# read from the precomputed summary table (one small join) instead of aggregating products
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes(PUBLIC_THROTTLES)
+@cache_response()
+def category_list(request):
+    try:
+        summaries = CategorySummary.objects.select_related('category').order_by('category__name')
+        return Response(CategorySummarySerializer(summaries, many=True).data)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 # create new category for product
 # View to handle POST requests for creating a new category
 @api_view(['POST'])
@@ -80,22 +155,34 @@ def delete_product(request, product_id):
         return Response({"error" : str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR) # other server error
 
 # view to handle UPDATE requests for updating specific product with id
+# stock is changed relatively with {"stock_delta": 10} (negative removes units), see adjust_stock
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def update_product(request, product_id):
     try:
         # retirve product from the database
         product = Product.objects.get(id=product_id)
+        delta = parse_stock_delta(request.data['stock_delta']) if 'stock_delta' in request.data else 0
 
         # pass product and incoming data from request to serializer, also allow partial updates
         serializer = ProductSerializer(product, data=request.data, partial=True)
 
 
         if serializer.is_valid():
-            serializer.save() # save only fields which were updated
+            with transaction.atomic():
+                if serializer.validated_data:
+                    serializer.save() # save only fields which were updated
+                if delta and not adjust_stock(Product.objects.filter(id=product_id), delta):
+                    transaction.set_rollback(True)
+                    return Response({"stock_delta": [f"Not enough stock to remove {-delta} units."]}, status=status.HTTP_400_BAD_REQUEST)
+            if delta:
+                product.refresh_from_db(fields=['stock'])
             return Response(serializer.data, status=status.HTTP_200_OK) # returns updates product data
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST) # return if error occurs
 
+    except InvalidParameter as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     except Product.DoesNotExist:
         return Response({"error" : "Product not found"}, status=status.HTTP_404_NOT_FOUND) # 404 if product by id not found
 
@@ -106,11 +193,14 @@ def update_product(request, product_id):
 # view to handle fetch from shop database for specific product with unique id (request from frontend)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes(PUBLIC_THROTTLES)
+@condition_on_catalog(individual_product_scope)
+@cache_response()
 def individual_product(request, product_id):
     try:
         product = Product.objects.get(id=product_id) # retrive product from db
         
-        serializer = ProductSerializer(product) # serialize to send to client
+        serializer = ProductSerializer(product, fields=PUBLIC_PRODUCT_FIELDS) # serialize to send to client
         
         return Response(serializer.data, status=status.HTTP_200_OK) # return serialized data
     
@@ -121,32 +211,40 @@ def individual_product(request, product_id):
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR) # same for 500
 
 # searchbar view
+# full text search over name + description, ranked by relevance (?search_product=...&limit=50&offset=0)
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes(PUBLIC_THROTTLES)
+@condition_on_catalog(search_product_scope, SEARCH_PARAMS)
+@cache_response(*SEARCH_PARAMS)
 def search_product(request):
     try:
         # get search query parameter
         search_query = request.GET.get('search_product', '')
+        limit, offset = parse_limit_offset(request)
 
-        # if search query is provided, filter products by name using not case sensetive
-        if search_query:
-            products = Product.objects.filter(name__icontains=search_query)  # if partial match
-        else:
-            products = Product.objects.none()  # if no query provided, return empty queryset
+        # ranked page of matches (single query), nothing if no query provided
+        products = search_products(search_query, limit, offset) if search_query else []
 
         # if no products found
-        if not products.exists():
+        if not products:
             return Response({"message": "No products found"}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = ProductSerializer(products, many=True)
+        serializer = ProductSerializer(products, many=True, fields=PUBLIC_PRODUCT_FIELDS)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
+    except InvalidParameter as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # retrive products by their ids (for cart frontend fetch). Pass ids in request body {"id" : [103, 105, 184 etc...]}
+# products come back in request order without duplicates, ids that don't exist are listed in
+# the X-Missing-Product-Ids response header
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes(PUBLIC_THROTTLES)
 def get_multiple_products(request):
     try:
         ids_list = request.data.get('ids', [])
@@ -156,23 +254,15 @@ def get_multiple_products(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # limit number of input ids to prevent abuse
-        MAX_IDS = 100
+        # limit number of input ids to prevent abuse (large requests are fetched in chunks)
         if len(ids_list) > MAX_IDS:
             return Response(
                 {"error": f"Too many IDs provided. Maximum allowed is {MAX_IDS}."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # convert all ids to integers and filter out invalid ones
-        valid_ids = []
-        for id_value in ids_list:
-            try:
-                valid_id = int(id_value)
-                if valid_id > 0:
-                    valid_ids.append(valid_id)
-            except (ValueError, TypeError):
-                continue  # skip invalid ids
+        # convert all ids to integers, filter out invalid ones and duplicates
+        valid_ids = clean_ids(ids_list)
 
         if not valid_ids:
             return Response(
@@ -180,12 +270,185 @@ def get_multiple_products(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        products = Product.objects.filter(id__in=valid_ids)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        products, missing_ids = fetch_products(valid_ids)  # per-product cache, only misses hit the db
+        response = Response(products, status=status.HTTP_200_OK)
+        if missing_ids:
+            response['X-Missing-Product-Ids'] = ','.join(map(str, missing_ids))
+        return response
     except Exception as e:
         # log the exception internally
         return Response(
             {"error": "An internal server error occurred."},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+# search-as-you-type suggestions from the in-memory prefix index, no database hit (?q=can&limit=10)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes(PUBLIC_THROTTLES)
+def autocomplete(request):
+    try:
+        limit = int(request.GET.get('limit') or 10)
+    except ValueError:
+        return Response({"error": "'limit' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    suggestions = autocomplete_index.lookup(request.GET.get('q', ''), max(1, min(limit, 50)))  # [{"id", "name"}]
+    return Response(suggestions, status=status.HTTP_200_OK)
+
+
+# bulk import/upsert from a JSON Lines or CSV upload (multipart field "file"), keyed on price_id.
+# format from ?file_format=jsonl|csv or the file extension. returns counts, per-row errors and rows/second
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_import_products(request):
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({"error": "Upload the catalog as multipart field 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        file_format = detect_format(request.GET.get('file_format'), upload.name)
+        report = import_products(upload.file, file_format, DEFAULT_BATCH_SIZE)
+        return Response(report, status=status.HTTP_200_OK)
+
+    except ImportFormatError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# delete many products at once, body {"ids": [1, 2, 3]} and/or {"category": "name"}
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def bulk_delete(request):
+    try:
+        deleted = bulk_delete_products(select_products(request.data))
+        return Response({"deleted": deleted}, status=status.HTTP_200_OK)  # 200 (not 204) so the count reaches the client
+
+    except InvalidParameter as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    except Category.DoesNotExist:
+        return Response({"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+# patch many products at once, body {"ids": [...]} and/or {"category": "name"}, plus {"changes": {"price": "1.99"}}
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def bulk_update(request):
+    try:
+        updated, errors = bulk_update_products(select_products(request.data), request.data.get('changes'))
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)  # return validation errors
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+    except InvalidParameter as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    except Category.DoesNotExist:
+        return Response({"error": "Category not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# stream the whole catalog (feeds, static site build, price sync) without building it in memory
+# ?file_format=ndjson (default, one product per line) or ?file_format=json (single array)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes(PUBLIC_THROTTLES)
+def export_products(request):
+    file_format = request.GET.get('file_format', 'ndjson')
+    if file_format not in EXPORT_FORMATS:
+        return Response({"error": "Unsupported format, use 'ndjson' or 'json'."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return StreamingHttpResponse(iter_catalog(file_format), content_type=EXPORT_FORMATS[file_format])
+
+
+# checkout: holds stock for a whole cart, body {"items": [{"id": 1, "quantity": 2}, ...]}.
+# all or nothing, 409 with the short products otherwise. the returned prices and stripe price ids
+# are the ones to charge; the reservation expires after SHOP_RESERVATION_MINUTES unless marked paid
+# (confirm_reservation)
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@throttle_classes(PUBLIC_THROTTLES)
+def reserve_stock(request):
+    try:
+        cart = parse_cart(request.data)
+        reservation, lines = reserve(cart)
+        items = [
+            {
+                "id": item.product_id,
+                "name": name,
+                "quantity": item.quantity,
+                "unit_price": f"{item.unit_price:.2f}",
+                "price_id": item.price_id,
+            }
+            for item, name in lines
+        ]
+        total = sum(item.unit_price * item.quantity for item, _ in lines)
+        return Response({
+            "reservation": str(reservation.id),
+            "expires_at": reservation.expires_at,
+            "items": items,
+            "total": f"{total:.2f}",
+        }, status=status.HTTP_201_CREATED)
+
+    except InvalidParameter as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    except OutOfStock as e:
+        return Response({"error": str(e), "unavailable": e.unavailable}, status=status.HTTP_409_CONFLICT)
+
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# called by the payment backend once the charge for a reservation succeeded. the held stock is kept
+# for good (expire_reservations skips paid reservations); a payment arriving after the reservation
+# expired gets 409 and has to be refunded, the stock may already be sold again
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def confirm_reservation(request, reservation_id):
+    try:
+        if confirm_payment(reservation_id):
+            return Response({"reservation": str(reservation_id), "status": Reservation.PAID}, status=status.HTTP_200_OK)
+
+        current = Reservation.objects.filter(pk=reservation_id).values_list('status', flat=True).first()
+        if current is None:
+            return Response({"error": "Reservation not found"}, status=status.HTTP_404_NOT_FOUND)
+        if current == Reservation.PAID:
+            return Response({"reservation": str(reservation_id), "status": current}, status=status.HTTP_200_OK)  # webhook retries
+        return Response({"error": "Reservation expired.", "status": Reservation.EXPIRED}, status=status.HTTP_409_CONFLICT)
+
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# live stock for product pages and the cart, ?ids=1,2,3 -> {"1": 5, "2": 0} (unknown ids are left out).
+# not cached: stock changes with every checkout, so it isn't part of the cached catalog responses
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes(PUBLIC_THROTTLES)
+def product_stock(request):
+    try:
+        ids = clean_ids(request.GET.get('ids', '').split(','))
+        if not ids:
+            return Response({"error": "'ids' must be a comma separated list of product ids."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_CART_LINES:
+            return Response({"error": f"Too many IDs provided. Maximum allowed is {MAX_CART_LINES}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        stock = Product.objects.filter(id__in=ids).values_list('id', 'stock')  # pk index, one query
+        return Response({str(pk): units for pk, units in stock}, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# per-view request counters in prometheus text format (only with SHOP_INSTRUMENTATION=True)
+def metrics(request):
+    if not settings.SHOP_INSTRUMENTATION:
+        raise Http404
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4')